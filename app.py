@@ -1,26 +1,33 @@
+import numpy as np
 import pandas as pd
 import streamlit as st
-from collections import defaultdict
 import inflect
 from figures import *
 from helper_fxns import *
 from projections import *
+from distribution import get_usage_distribution
+from title_index import get_title_index, get_title_search
+from profiling import RerunProfiler, start_profiler
+from dataset import Dataset
+from packages import COMPARISON_COLUMNS, read_costs
+from title_costs import (ALLOCATION_METHODS, RANKING_VALUES, get_title_cost_matrix, read_title_prices,
+                         title_ranking)
 
 # intitializes inflect class for grammar
 p = inflect.engine()
 
-# Empty Panda Dataframe that stores a read TRJ1 File
-df = pd.DataFrame()
-
-# Empty List that holds TRJ1 Objects
-trj1_list = []
-
 # Saves the count of total TRJ1 Objects
 trj1_count = 0
 
 # Set the layout of the Streamlit
 st.set_page_config(page_icon=None, page_title="Counter Visualization")
 
+# times each stage of this rerun when profiling is turned on, otherwise its stages do nothing
+profiler = start_profiler()
+
+# TRJ1 objects of this session, kept between reruns so that only added files are parsed
+dataset = st.session_state.setdefault("dataset", Dataset())
+
 # display sidebar
 with st.sidebar:
     st.subheader(
@@ -30,16 +37,35 @@ with st.sidebar:
         type=['csv', 'tsv', 'xlsx'],
         accept_multiple_files=True,
     ):
-        for file in file_upload:
-            df = read_file(file, trj1_list)
+        with profiler.stage("ingestion"):
+            dataset.sync(upload_sources(file_upload))
         # displays files uploaded successfully using inflect module
         st.success(p.no("file", len(file_upload)) +
                             " uploaded successfully!", icon="✅")
     else:
-        df = read_default_files(trj1_list)
+        with profiler.stage("ingestion"):
+            # the default reports are loaded once and shared by every session
+            dataset.sync(default_sources(), load_default_files)
+
+# files of more than one platform or publisher are grouped into packages, which are compared below,
+# and the rest of the page shows the package chosen in the sidebar
+group_by = None
+package_names = []
+if package_groupings := dataset.get_package_groupings():
+    group_by = st.sidebar.radio("Your files cover several packages. Group them by:", package_groupings, key="group_by")
+    package_names = dataset.get_package_names(group_by)
+    # a file's rows are never split between packages, so files of several platforms or publishers stand alone
+    if mixed_files := dataset.get_mixed_files(group_by):
+        st.warning(f"Warning: {', '.join(mixed_files)} list titles of more than one {group_by.lower()}, "
+                   "so each is shown as a package of its own.", icon="⚠️")
+if len(package_names) > 1:
+    package = st.sidebar.selectbox("Package shown in detail:", package_names, key="package")
+    package_dataset = dataset.get_package(group_by, package)
+else:
+    package_dataset = dataset
 
-trj1_count = len(trj1_list)
-trj1_list = sort_trj1_list(trj1_list)
+trj1_count = len(dataset.files)
+trj1_list = package_dataset.trj1_list
 
 st.markdown("#### This app analyzes and plots TR_J1 journal usage data to allow you \
             to easily assess the usage distribution, cost per use, and usage trends \
@@ -53,7 +79,10 @@ with st.expander("How to use:"):
         "This app was created by [Rome Duong](https://www.linkedin.com/in/phearom-d-503862195/), [Ricardo Zamora](https://www.linkedin.com/in/zamora-ricardo/), and [Clara del Junco](https://cdeljunco.github.io/me/).")
 
 check_fiscal_year(trj1_list)
-check_duplicate_dates(trj1_list)
+check_report_headers(trj1_list)
+# months covered by more than one file, found once per set of files
+if overlaps := package_dataset.get_overlapping_months():
+    warn_duplicate_dates(overlaps)
 
 # Accurately gets all dates for each file and saves it to a dict using dict comprehension
 # key = name of file, val = list of dates
@@ -67,7 +96,7 @@ st.subheader("You have successfully uploaded " + p.no("file",
                 trj1_count) + " with the following details: ")
 
 # extract unique item requests for each TRJ1 object in trj1_list
-unique_journals = [trj1.dataframe['Metric_Type'].eq('Unique_Item_Requests').sum() for trj1 in trj1_list]
+unique_journals = [trj1.get_title_count('Unique_Item_Requests') for trj1 in trj1_list]
 
 # create date column for display
 date_col = [f"{date_range[0].strftime('%m/%Y')} - {date_range[-1].strftime('%m/%Y')}" for date_range in df_dates.values()]
@@ -81,6 +110,8 @@ file_details = {
 
 # creates a collapsible view of the dataframe containing in details the reporting total, the titles, and the counts of journals
 with st.expander("Expand to see file details:", expanded=True):
+    if len(package_names) > 1:
+        st.caption(f"Showing the files of {package}. The package can be changed in the sidebar.")
     # convert files' data into dataframe and display it, setting to max width
     file_details_df = pd.DataFrame(file_details)
     file_details_df = file_details_df.rename_axis("Row Index")
@@ -91,16 +122,17 @@ st.write("#")  # simple spacer
 with st.expander("Expand to see raw TR_J1 data:"):
     if not date_col:
         st.write("Please upload data")
-    else:
+    # the tables are only built once asked for, and then one page at a time
+    elif st.checkbox("Show the raw data", key="show_raw_data"):
         tabs = st.tabs(date_col)
         for i, trj1 in enumerate(trj1_list):
             with tabs[i]:
-                st.dataframe(trj1.dataframe)
+                paginated_dataframe(trj1.get_row_count(), trj1.get_arrow_table, key=f"raw_page_{i}")
 
 st.write("#")  # simple spacer
 
 # Decision Tree to verify that both metric types exist in trj1 files
-if 'Unique_Item_Requests' in df['Metric_Type'].values and "Total_Item_Requests" in df['Metric_Type'].values:
+if all('Unique_Item_Requests' in trj1.metric_types and "Total_Item_Requests" in trj1.metric_types for trj1 in trj1_list):
     metric_choice = st.radio(
         "Select which metric type to use:",
         ("Unique Item Requests", "Total Item Requests")
@@ -110,90 +142,110 @@ else:
         'Please make sure that you have a valid metric type of Total Item Requests or Unique Item Requests', 
                 icon="⚠️"))
 # only include rows for specified metric choice
-trj1_list = update_metric_choice(trj1_list, metric_choice)
+with profiler.stage("metric filtering"):
+    trj1_list = update_metric_choice(trj1_list, metric_choice)
 
-# Filter incomplete/complete TRJ1's
-complete_trj1_list, incomplete_trj1 = set_complete_incomplete_files(trj1_list)
+with profiler.stage("projection"):
+    # Filter incomplete/complete TRJ1's, done once per set of files
+    complete_trj1_list, incomplete_trj1 = package_dataset.get_complete_incomplete_files()
 
-# Create projections for each incomplete TRJ1 
-for incomplete in incomplete_trj1:
-    projection = project_total_uses(complete_trj1_list, incomplete)
-    incomplete.set_projected_usage(projection)
+    # Create projections for all incomplete TRJ1's in one batch, once per set of files and metric type.
+    # Projections take the monthly pattern of use from the complete years, so a package without one has none.
+    if complete_trj1_list:
+        projections = package_dataset.get_projections(trj1_list[0].metric_type)
+    else:
+        projections = [None for _ in incomplete_trj1]
+        if incomplete_trj1:
+            st.warning('Warning: None of these files covers a complete fiscal year, so usage and cost per use \
+                        can not be projected for the entire fiscal year.', icon="⚠️")
+    for incomplete, projection in zip(incomplete_trj1, projections):
+        incomplete.set_projected_usage(projection)
+
+# Usage and cost per use of every package side by side, computed for several packages at once
+if len(package_names) > 1:
+    st.header("Package Comparison")
+    st.write("Compare the usage and cost per use of all of your packages. Costs are read from a csv with the columns \
+                Package, File and Cost, one row per TR_J1 file, which can be started from the template below.")
+    costs_file = st.file_uploader("Upload the costs of every package:", type=["csv"], key="package_costs")
+    package_costs = {}
+    if costs_file:
+        costs_file.seek(0)
+        try:
+            package_costs = read_costs(costs_file)
+        except ValueError as error:
+            st.warning(f"Warning: {error}", icon="⚠️")
+    with profiler.stage("package comparison"):
+        comparison, comparison_errors = dataset.get_package_comparison(group_by, trj1_list[0].metric_type, package_costs)
+    for error in comparison_errors:
+        st.warning(f"Warning: {error}", icon="⚠️")
+
+    # incomplete fiscal years are compared on their projected usage and cost per use, as in the sidebar
+    comparison = comparison.assign(
+        Fiscal_Year=comparison["Start_Date"] + " - " + comparison["End_Date"],
+        Full_Year_Usage=comparison["Projected_Usage"].fillna(comparison["Reporting_Period_Total"]),
+        Full_Year_Cost_Per_Use=comparison["Cost_Per_Use"].fillna(comparison["Projected_Cost_Per_Use"]),
+    )
+    compared_value = st.radio("Compare packages by:",
+                              ("Full_Year_Usage", "Full_Year_Cost_Per_Use", "Titles", "Median_Use"),
+                              format_func=lambda column: column.replace("_", " "), key="compared_value")
+    with profiler.stage("package comparison chart"):
+        st.plotly_chart(packageComparisonChart(comparison, compared_value))
+    with st.expander("Expand to see the comparison of every file:"):
+        st.dataframe(comparison[COMPARISON_COLUMNS], use_container_width=True)
+    st.download_button("Download a costs template", comparison[["Package", "File", "Cost"]].to_csv(index=False),
+                       file_name="package_costs.csv", mime="text/csv")
 
 # sidebar (Cost Per Use: Input and Output)
 st.sidebar.write("#")  # simple spacer
 st.sidebar.header("Cost Per Use")
 st.sidebar.write('Input the journal package cost in dollars for the period covered by each TR_J1 file:')
 cpu_list = []
+file_costs = []
 
 for i, trj1 in enumerate(trj1_list):
     cost = st.sidebar.number_input(
         ' ' + date_col[i] + ' ', min_value=0.00, format="%f", key=trj1.name)
+    file_costs.append(cost)
     if cost != 0 and trj1.is_Full_FY():
         trj1.set_cost_per_use(cost) 
         cpu_list.append(trj1.cpu)
-    elif cost != 0 and not trj1.is_Full_FY():
+    elif cost != 0 and not trj1.is_Full_FY() and trj1.projected_usage:
         trj1.set_projected_cost_per_use(cost)
         cpu_list.append(trj1.projected_cpu)
     else: 
         trj1.cpu = 0
-        trj1.projected_cpu = 0
+        # without a projection there is no projected cost per use, rather than one of 0
+        trj1.projected_cpu = 0 if trj1.is_Full_FY() or trj1.projected_usage else None
         cpu_list = [0 for _ in trj1_list]
 
-    st.sidebar.write("The Cost Per Use is : $ " + format(trj1.cpu if trj1.is_Full_FY() else trj1.projected_cpu, ".2f") + ("*" if not trj1.is_Full_FY() else ""))
-if incomplete_trj1:
+    if not trj1.is_Full_FY() and not trj1.projected_usage:
+        st.sidebar.write("The Cost Per Use can't be projected without a complete fiscal year of data.")
+    else:
+        st.sidebar.write("The Cost Per Use is : $ " + format(trj1.cpu if trj1.is_Full_FY() else trj1.projected_cpu, ".2f") + ("*" if not trj1.is_Full_FY() else ""))
+if incomplete_trj1 and complete_trj1_list:
     st.sidebar.write("*Data provided for this year is incomplete. \
                             This is the projected CPU for the entire fiscal year \
                             based on patterns of use in the other years of data provided.")
 
 ############### Streamlit: Displaying Data #################
-# using counter to get occurences of each num
-titles_set = set()
-max_df_values = []
+# usage distribution of each file, built once per file and metric type and reused on every rerun
+with profiler.stage("distribution"):
+    distributions = [get_usage_distribution(trj1) for trj1 in trj1_list]
 
-title_header = "Journals with this many item requests(double-click to see full list)"
-# loop through each dataframe in the list to create new dataframe
-metric_choice = "Reporting_Period_Total"
-count_header = "Number of journals with this many item requests"
-title_header = "Titles of journals with this many item requests"
+# sorted titles of every file for the multiselect, indexed by title, ISSN and DOI once per set of files
+with profiler.stage("title search index"):
+    title_search = get_title_search(trj1_list, trj1_list[0].metric_type if trj1_list else None)
 
-# Define a defaultdict to store the titles of the journals
-titles = defaultdict(list)
-titles_set = set()
-
-# Iterate through the list of trj1 objects
-occurrences_list = []
-
-for trj1 in trj1_list:
-
-    df = trj1.dataframe
-    # Count the number of occurrences of each value in the metric_choice column
-    occurrences = df[metric_choice].value_counts().sort_index()
-
-    # Group the data by the values in the metric_choice column
-    grouped_data = df.groupby(metric_choice)
-
-    # Apply a lambda function to each group to create a list of titles
-    titles_list = grouped_data.apply(lambda x: x['Title'].tolist())
-
-    # Combine the occurrences and titles_list into a single DataFrame
-    usage_df = pd.concat([occurrences, titles_list], axis=1).reset_index()
-
-    # Rename columns
-    usage_df.columns = [metric_choice, count_header, title_header]
-
-    # Store the titles in a defaultdict
-    for index, row in usage_df.iterrows():
-        titles[row[metric_choice]].extend(row[title_header])
-        titles_set.update(row[title_header])
-    occurrences_list.append(usage_df)
+# title usage matrix of the loaded files, built once per set of files and metric type
+with profiler.stage("title cost matrix"):
+    title_costs = get_title_cost_matrix(trj1_list, trj1_list[0].metric_type) if trj1_list else None
 
 # Create Line plot of Distribution of Cost Per Use
 st.header("Distribution of Cost Per Use")
 if date_col and 0 not in cpu_list:
-    fig1 = linePlot(date_col, cpu_list)[0]
-    fig1.update_layout(yaxis=dict(range=[0, max(linePlot(date_col, cpu_list)[1]["Cost Per Use"])+1]))
-    st.plotly_chart(fig1)
+    with profiler.stage("cost per use chart"):
+        fig1 = linePlot(date_col, cpu_list)[0]
+        st.plotly_chart(fig1)
 else:
     st.warning("Please provide input for Cost Per Use in the sidebar")
 
@@ -204,81 +256,197 @@ st.header("Usage Distribution")
 st.write("See which journals were used the most and least for each \
             of the time periods covered by your TR_J1 reports")
 
+# Histogram of one file's usage distribution with its filter slider. Moving the slider reruns only this tab,
+# using the files and distributions kept in session state by the last full run.
+@fragment
+def histogram_tab(i: int) -> None:
+    # measured with the full run, or on its own when only this tab reruns
+    fragment_profiler = profiler.for_fragment("histogram")
+    trj1 = st.session_state["trj1_list"][i]
+    distribution = st.session_state["distributions"][i]
+    date_label = st.session_state["date_col"][i]
+    max_report = distribution.max_value()
+    max_count = distribution.max_count()
+
+    # create a filter slider and use user input to look up the titles in range in the distribution
+    filter_slider = st.slider("Set the minimum and maximum reporting period total (x-axis) here.", 1, max_report, value=(1, max_report), key=i)
+    filter_min = filter_slider[0]
+    filter_max = filter_slider[1]
+    with fragment_profiler.stage(f"filter {date_label}"):
+        filtered_rows = distribution.rows_in_range(filter_min, filter_max)
+        # the histogram only needs the titles and totals, the monthly usage is only built for the shown page
+        filtered_df = trj1.get_metric_dataframe(filtered_rows, include_months=False)
+
+    # display number of filtered journals
+    filter_diff = filter_max - filter_min
+    filter_count = len(filtered_df)
+
+    # grammar based on filter slider using inflect
+    if filter_diff:
+        st.write("There " + p.plural("is", filter_count) + " currently " + p.no("journal", filter_count) +
+                " within the following range: {} - {} reporting period total.".format(filter_min, filter_max))
+    else:
+        st.write("There " + p.plural("is", filter_count) + " currently " + p.no(
+            "journal", filter_count) + " with a {} reporting period total.".format(filter_min))
+
+
+    # determine the height for the histogram based on the maximum count
+    chart_height = 600 if 300 <= max_count <= 600 else max_count if max_count < 300 else 500
+
+    # create a collapsible view of the filtered dataframe
+    with st.expander("Expand to see the filtered data behind the distribution:", expanded=False):
+        if st.checkbox("Show the filtered data", key=f"show_filtered_{i}"):
+            st.write("#")
+            st.caption("Click on column header to sort the page by ascending/descending order")
+            paginated_dataframe(filter_count, lambda page: trj1.get_metric_arrow_table(filtered_rows[page]), key=f"filtered_page_{i}",
+                                use_container_width=True)
+
+    # display the histogram
+    with fragment_profiler.stage(f"histogram {date_label}"):
+        stacked_hist = histogram(filtered_df, filter_slider[1], chart_height)
+        st.write("#")
+        st.altair_chart(stacked_hist, use_container_width=True)
+    fragment_profiler.finish()
+
+# intermediate results read by the parts of the page that rerun on their own
+st.session_state["trj1_list"] = trj1_list
+st.session_state["distributions"] = distributions
+st.session_state["date_col"] = date_col
+st.session_state["title_search"] = title_search
+st.session_state["title_costs"] = title_costs
+st.session_state["file_costs"] = file_costs
+# incomplete fiscal years are costed on their projected usage, each title's usage scaled like the package's
+st.session_state["usage_scale"] = [trj1.projected_usage / trj1.rpt if not trj1.is_Full_FY() and trj1.projected_usage
+                                   and trj1.rpt else 1 for trj1 in trj1_list]
+
 if not date_col:
     st.write("Please provide a data input")
 else:
     hist_tab = st.tabs(date_col)
-    # precompute max_report across all dataframes
-    max_reports = [int(occurrences[metric_choice].max()) for occurrences in occurrences_list]
-    for i, trj1 in enumerate(trj1_list):
+    for i in range(len(trj1_list)):
         with hist_tab[i]:
-            # get the dataframe from the list created earlier so it can be displayed
-            usage_df = occurrences_list[i].rename_axis("Row Index")
-            max_count = usage_df[count_header].max()
-
-            # create a filter slider and use user input to create a filtered dataframe
-            filter_slider = st.slider("Set the minimum and maximum reporting period total (x-axis) here.", 1, max_reports[i], value=(1, max_reports[i]), key=i)
-            filter_min = filter_slider[0]
-            filter_max = filter_slider[1]
-            filtered_df = trj1.dataframe.query('Reporting_Period_Total >= @filter_min and Reporting_Period_Total <= @filter_max')
-
-            # display number of filtered journals
-            filter_diff = filter_max - filter_min
-            filter_count = len(filtered_df)
-            
-            # grammar based on filter slider using inflect
-            if filter_diff:
-                st.write("There " + p.plural("is", filter_count) + " currently " + p.no("journal", filter_count) +
-                        " within the following range: {} - {} reporting period total.".format(filter_min, filter_max))
-            else:
-                st.write("There " + p.plural("is", filter_count) + " currently " + p.no(
-                    "journal", filter_count) + " with a {} reporting period total.".format(filter_min))
-
-
-            # determine the height for the histogram based on the maximum count
-            chart_height = 600 if 300 <= max_count <= 600 else max_count if max_count < 300 else 500
-
-            # create a collapsible view of the filtered dataframe
-            with st.expander("Expand to see the filtered data behind the distribution:", expanded=False):
-                st.write("#")
-                st.caption("Click on column header to sort by ascending/descending order")
-                st.dataframe(filtered_df, use_container_width=True)
-
-            # display the histogram
-            stacked_hist = histogram(filtered_df, filter_slider[1], chart_height)
-            st.write("#")
-            st.altair_chart(stacked_hist, use_container_width=True)
+            histogram_tab(i)
 
 st.write("Click on plot and scroll to zoom, click & drag to move, \
             and double-click to reset view. Click ... at top right \
             to download the chart as an SVG/PNG.")
 
+# Title search, multiselect and bar chart, which rerun on their own when the search or the selection changes
+@fragment
+def bar_chart_section() -> None:
+    fragment_profiler = profiler.for_fragment("bar chart")
+    trj1_list = st.session_state["trj1_list"]
+    title_search = st.session_state["title_search"]
+    # search box narrowing the multiselect options, so large packages don't send every title on each rerun
+    title_query = st.text_input("Filter the titles below by title, ISSN or DOI:")
+    # titles already selected stay in the options when the search changes, as long as a loaded file has them
+    previous_selection = [title for title in st.session_state.get("titles_selected", []) if title in title_search]
+    title_options = list(dict.fromkeys([*previous_selection, *title_search.search(title_query)]))
+    if not title_query.strip():
+        title_options.sort()
+
+    # multiselect option for titles
+    titles_selected = st.multiselect(
+        "Search and click on the titles you want to view in the bar chart.",
+        title_options,
+        default=previous_selection
+    )  # contains a max selections param if we want the user to only select a limited amount
+    st.session_state["titles_selected"] = titles_selected
+
+    bar_df = []
+    bar_df.extend(titles_selected)
+
+    # determine whether the user has selected any journal
+    if not titles_selected:
+        st.warning("To view journals over time, please select journals above.")
+    else:
+        with fragment_profiler.stage("bar chart"):
+            # index of every title's reporting period total per fiscal year, built once for the loaded files
+            title_index = get_title_index(trj1_list, st.session_state["date_col"])
+            if bar_df:
+                # look up the selected titles, with the fiscal year as a categorical variable, and create a Plotly bar chart
+                df = title_index.lookup(bar_df, trj1_list[0].metric_type)
+                fig = barChart(df)
+                st.plotly_chart(fig)
+            else:
+                st.warning("Please select at least one title to view journals over time.")
+    fragment_profiler.finish()
+
 # Create a bar chart showing the reporting period for specific journals
 st.header("Reporting Period Total over Time")
-# multiselect option for titles
-titles_selected = st.multiselect(
-    "Search and click on the titles you want to view in the bar chart.",
-    sorted(titles_set)
-)  # contains a max selections param if we want the user to only select a limited amount
-
-bar_df = []
-bar_df.extend(titles_selected)
-
-# determine whether the user has selected any journal
-if not titles_selected:
-    st.warning("To view journals over time, please select journals above.")
+bar_chart_section()
+
+# Allocation method, price file and rankings, which rerun on their own when one of their inputs changes
+@fragment
+def title_cost_section() -> None:
+    fragment_profiler = profiler.for_fragment("title rankings")
+    try:
+        _title_cost_section(fragment_profiler)
+    finally:
+        fragment_profiler.finish()
+
+# Body of title_cost_section, which returns early while inputs are missing
+def _title_cost_section(fragment_profiler: RerunProfiler) -> None:
+    title_costs = st.session_state["title_costs"]
+    file_costs = st.session_state["file_costs"]
+    date_col = st.session_state["date_col"]
+    method = st.radio("Split the package cost between journals by:", list(ALLOCATION_METHODS),
+                      format_func=ALLOCATION_METHODS.get, key="allocation_method")
+    if method == "usage":
+        st.caption("Every used journal then has the cost per use of the package, so rank journals by usage or cost.")
+
+    prices = None
+    if method != "usage":
+        prices_file = st.file_uploader("Upload the price of each journal, as a csv with a Price column and a Title, "
+                                       "Print_ISSN, Online_ISSN or DOI column:", type=["csv"], key="title_prices")
+        if not prices_file:
+            st.warning("Please upload the journal prices to split costs by price.")
+            return
+        prices_file.seek(0)
+        try:
+            prices = title_costs.match_prices(read_title_prices(prices_file))
+        except ValueError as error:
+            st.warning(f"Warning: {error}", icon="⚠️")
+            return
+        st.caption(f"{int(np.count_nonzero(~np.isnan(prices)))} of {len(prices)} journals have a price.")
+    if method != "price_file" and not any(file_costs):
+        st.warning("Please provide input for Cost Per Use in the sidebar")
+        return
+
+    file_choice = st.selectbox("Rank journals for:", ["All years", *date_col], key="ranking_file")
+    ranked_by = st.selectbox("Rank journals by:", RANKING_VALUES, format_func=lambda value: value.replace("_", " "),
+                             key="ranking_value")
+    k = int(st.number_input("Number of journals in each ranking:", min_value=1, max_value=1000, value=20,
+                            key="ranking_size"))
+    file = None if file_choice == "All years" else date_col.index(file_choice)
+    with fragment_profiler.stage("title rankings"):
+        usage, cost = title_costs.allocate(file_costs, method, prices, st.session_state["usage_scale"])
+        highest = title_ranking(title_costs, usage, cost, k, largest=True, file=file, by=ranked_by)
+        lowest = title_ranking(title_costs, usage, cost, k, largest=False, file=file, by=ranked_by)
+
+    highest_column, lowest_column = st.columns(2)
+    with highest_column:
+        st.subheader(f"Highest {ranked_by.replace('_', ' ').lower()}")
+        st.dataframe(highest, use_container_width=True)
+    with lowest_column:
+        st.subheader(f"Lowest {ranked_by.replace('_', ' ').lower()}")
+        st.dataframe(lowest, use_container_width=True)
+    if incomplete_years := [date_col[i] for i, scale in enumerate(st.session_state["usage_scale"]) if scale != 1]:
+        st.caption("*The usage of " + ", ".join(incomplete_years) + " is projected for the entire fiscal year, \
+                    as in the cost per use sidebar.")
+
+# Create rankings of the journals with the highest and lowest cost per use
+st.write("#")  # simple spacer
+st.header("Title Cost Per Use")
+st.write("Split each year's package cost between its journals to find the journals with the highest \
+            and lowest cost per use, for example to decide which to cancel.")
+if title_costs is None:
+    st.write("Please provide a data input")
 else:
-    # create a new dataframe that combines all dataframes together and add a column of Fiscal Year to the dataframe corresponding to their fiscal year
-    concat_df = pd.concat([df.dataframe.assign(Fiscal_Year=date_col[i]) for i, df in enumerate(trj1_list)], ignore_index=True)
-    if bar_df:
-        # filter the dataframe by the selected titles
-        df = concat_df[concat_df["Title"].isin(bar_df)]
-        # convert the fiscal year column into a categorical variable and create a Plotly bar chart
-        df['Fiscal_Year'] = pd.Categorical(df['Fiscal_Year'])
-        fig = barChart(df)
-        st.plotly_chart(fig)
-    else:
-        st.warning("Please select at least one title to view journals over time.")
+    title_cost_section()
+
+# shows the time and memory of each stage in the sidebar when profiling is turned on
+profiler.finish()
 
 
 # st.write([trj1.rpt for trj1 in trj1_list])
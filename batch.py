@@ -0,0 +1,88 @@
+# This file contains the command line batch mode, which computes the cost per use and projected usage
+# of many journal packages without the Streamlit app.
+#
+# Usage: python batch.py REPORTS_DIR COSTS_CSV [--output report.csv] [--metric Unique_Item_Requests]
+#
+# Every subdirectory of REPORTS_DIR is a package holding one TR_J1 report per fiscal year (csv, tsv or
+# xlsx, searched recursively). COSTS_CSV has the columns Package, File and Cost, where File is the name
+# of a report in the package's directory. Packages are processed in parallel worker processes.
+
+import argparse
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import pandas as pd
+from helper_fxns import INGEST_WORKERS, get_read_func, load_trj1
+from packages import REPORT_COLUMNS, combine_summaries, read_costs, summarize_package_safely
+from trj1 import METRIC_TYPES, TRJ1
+
+# MIME type of each supported report extension, as passed to get_read_func by the app
+FILE_TYPES = {
+    ".csv": "text/csv",
+    ".tsv": "text/tab-separated-values",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+# Returns the report paths of every package, keyed by the name of its directory under root
+def find_packages(root: str) -> Dict[str, List[str]]:
+    packages = {}
+    for package in sorted(os.listdir(root)):
+        package_dir = os.path.join(root, package)
+        if not os.path.isdir(package_dir):
+            continue
+        paths = []
+        for directory, _, files in os.walk(package_dir):
+            paths.extend(os.path.join(directory, file) for file in files
+                         if os.path.splitext(file)[1].lower() in FILE_TYPES)
+        if paths:
+            packages[package] = sorted(paths)
+    return packages
+
+
+# Loads a report from disk, reusing the on-disk cache of cleaned reports
+def load_report(path: str) -> TRJ1:
+    with open(path, "rb") as f:
+        content = f.read()
+    return load_trj1(os.path.basename(path), content, get_read_func(FILE_TYPES[os.path.splitext(path)[1].lower()]))
+
+
+# Processes every package under root, with the same calculations as the cost per use sidebar of the app, and
+# returns the consolidated report with the errors of packages that failed
+def run_batch(root: str, costs: Dict[Tuple[str, str], float], metric_type: str = "Unique_Item_Requests",
+              max_workers: int = INGEST_WORKERS) -> Tuple[pd.DataFrame, List[str]]:
+    packages = find_packages(root)
+    jobs = [(package, paths, {file: cost for (cost_package, file), cost in costs.items() if cost_package == package},
+             metric_type, load_report) for package, paths in packages.items()]
+
+    if max_workers <= 1 or len(jobs) <= 1:
+        results = [summarize_package_safely(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(summarize_package_safely, *zip(*jobs)))
+
+    return combine_summaries(results, REPORT_COLUMNS)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compute the cost per use of many journal packages from TR_J1 reports.")
+    parser.add_argument("reports_dir", help="directory with one subdirectory of TR_J1 reports per package")
+    parser.add_argument("costs", help="csv with the columns Package, File and Cost")
+    parser.add_argument("-o", "--output", help="csv file to write the report to, printed when omitted")
+    parser.add_argument("-m", "--metric", choices=METRIC_TYPES, default="Unique_Item_Requests",
+                        help="metric type used for usage and cost per use (default: %(default)s)")
+    parser.add_argument("-w", "--workers", type=int, default=INGEST_WORKERS,
+                        help="number of packages processed in parallel (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    report, errors = run_batch(args.reports_dir, read_costs(args.costs), args.metric, args.workers)
+    report.to_csv(args.output if args.output else sys.stdout, index=False)
+    for error in errors:
+        print(f"Error: {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
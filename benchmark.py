@@ -0,0 +1,310 @@
+# This file contains the benchmark suite, which times each stage of the app on synthetic TR_J1 reports
+# and compares the results against a stored baseline so that performance regressions are caught.
+#
+# Usage: python benchmark.py [--titles 2000] [--months 12] [--files 4] [--ingest-workers 1]
+#                           [--save-baseline | --baseline]
+#
+# The last synthetic report covers fewer months than a fiscal year, so that the projection is exercised.
+# Caches are cleared before every stage, so each measurement is of a first, uncached run. Reports are parsed
+# in this process unless --ingest-workers is raised, since the memory of worker processes is not counted.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import file_cache
+import helper_fxns
+from distribution import get_usage_distribution
+from figures import barChart, figure_cache, histogram
+from helper_fxns import (get_read_func, read_default_files, read_file, read_files, sort_trj1_list,
+                         update_metric_choice)
+from projections import project_total_uses, set_complete_incomplete_files
+from title_costs import get_title_cost_matrix, title_cost_cache, title_ranking
+from title_index import get_title_index, title_index_cache
+from trj1 import METRIC_TYPES, TRJ1
+
+# Default location of the stored baseline
+BASELINE_PATH = "benchmark_baseline.json"
+
+# A stage regresses when it is this much slower, or uses this much more memory, than the baseline
+DEFAULT_TOLERANCE = 0.25
+
+# Stages that take less than this many seconds are not compared, since their timing is mostly noise
+MIN_COMPARED_SECONDS = 0.01
+
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+class _Upload:
+    """
+    Stand-in for the UploadedFile objects that Streamlit passes to read_files
+
+    Parameters
+    ----------
+    name: str
+            file name
+    type: str
+            MIME type of the file
+    content: bytes
+            file contents
+    """
+
+    def __init__(self, name: str, type: str, content: bytes) -> None:
+        self.name = name
+        self.type = type
+        self._content = content
+
+    def getvalue(self) -> bytes:
+        return self._content
+
+
+# Returns a synthetic TR_J1 report with a Total_Item_Requests and a Unique_Item_Requests row per title.
+# Usage follows a long-tailed distribution like real packages, where most titles are rarely used.
+def make_report(titles: int, months: int, start: datetime, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    month_headers = list(pd.date_range(start, periods=months, freq="MS").to_pydatetime())
+    unique = rng.poisson(rng.pareto(1.5, size=(titles, 1)) * 2, size=(titles, months))
+    total = unique + rng.poisson(0.5, size=(titles, months))
+
+    ids = np.arange(titles)
+    details = pd.DataFrame({
+        "Title": [f"Journal of Synthetic Studies {i}" for i in ids],
+        "Publisher": "Synthetic Publisher",
+        "Publisher_ID": "",
+        "Platform": "SyntheticLink",
+        "DOI": [f"10.9999/{i}" for i in ids],
+        "Proprietary_ID": [f"SY:{i}" for i in ids],
+        "Print_ISSN": [f"{i // 1000:04d}-{i % 1000:03d}0" for i in ids],
+        "Online_ISSN": [f"{i // 1000:04d}-{i % 1000:03d}1" for i in ids],
+        "URI": "",
+    })
+    rows = []
+    for metric_type, usage in zip(METRIC_TYPES, (total, unique)):
+        rows.append(details.assign(Metric_Type=metric_type, Reporting_Period_Total=usage.sum(axis=1))
+                    .join(pd.DataFrame(usage, columns=month_headers)))
+    # each title's metric types are listed together, as in the reports
+    return pd.concat(rows).sort_index(kind="stable").reset_index(drop=True)
+
+
+# Writes report as an xlsx file with the 13 header rows of a COUNTER report above the column headers
+def write_report(report: pd.DataFrame, path: str) -> None:
+    months = [column for column in report.columns if isinstance(column, datetime)]
+    header = pd.DataFrame([
+        ["Report_Name", "Journal Requests (Excluding OA_Gold)"],
+        ["Report_ID", "TR_J1"],
+        ["Release", 5],
+        ["Institution_Name", "Synthetic Library"],
+        ["Institution_ID", "SY:1"],
+        ["Metric_Types", "; ".join(METRIC_TYPES)],
+        ["Report_Filters", "Access_Method=Regular; Access_Type=Controlled; Data_Type=Journal"],
+        ["Report_Attributes", ""],
+        ["Exceptions", ""],
+        ["Reporting_Period", f"Begin_Date={months[0]:%Y-%m-%d}; "
+                             f"End_Date={(pd.Timestamp(months[-1]) + pd.offsets.MonthEnd()):%Y-%m-%d}"],
+        ["Created", f"{datetime.now():%Y-%m-%dT%H:%M:%SZ}"],
+        ["Created_By", "benchmark.py"],
+    ])
+    with pd.ExcelWriter(path) as writer:
+        header.to_excel(writer, header=False, index=False)
+        report.to_excel(writer, startrow=13, index=False)
+
+
+# Writes files synthetic reports to directory: full fiscal years from July, then one of partial_months months
+def write_reports(directory: str, titles: int, months: int, files: int, partial_months: int) -> List[str]:
+    paths = []
+    for i in range(files):
+        start = datetime(2019 + i, 7, 1)
+        report_months = partial_months if i == files - 1 and files > 1 else months
+        path = os.path.join(directory, f"Synthetic-TR_J1-FY{start.year + 1}.xlsx")
+        write_report(make_report(titles, report_months, start, seed=i), path)
+        paths.append(path)
+    return paths
+
+
+# Empties the caches of the app, so that every stage is measured as a first run
+def clear_caches(trj1_list: List[TRJ1] = ()) -> None:
+    file_cache.parse_cache.clear()
+    file_cache.default_cache.clear()
+    figure_cache.clear()
+    title_index_cache.clear()
+    title_cost_cache.clear()
+    for trj1 in trj1_list:
+        trj1.derived.clear()
+
+
+# Calls func repeat times and returns its result with the fastest wall time, then once more with tracemalloc
+# for the peak memory, since tracing allocations slows down the timed runs
+def measure(func: Callable, repeat: int, setup: Callable = lambda: None) -> Dict:
+    seconds = []
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        result = func()
+        seconds.append(time.perf_counter() - start)
+
+    setup()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"result": result, "seconds": min(seconds), "peak_mb": peak / 2 ** 20}
+
+
+# Runs every stage on reports in directory and returns their measurements, keyed by stage name
+def run_benchmarks(directory: str, paths: List[str], repeat: int) -> Dict[str, Dict]:
+    results = {}
+    uploads = []
+    for path in paths:
+        with open(path, "rb") as f:
+            uploads.append(_Upload(os.path.basename(path), XLSX_TYPE, f.read()))
+
+    results["read_files"] = measure(lambda: read_files(uploads, []), repeat, clear_caches)
+    results["read_file"] = measure(lambda: read_file(uploads[0], []), repeat, clear_caches)
+
+    def read_defaults():
+        trj1_list = []
+        read_default_files(trj1_list)
+        return trj1_list
+    cwd = os.getcwd()
+    os.chdir(directory)  # read_default_files reads ./data
+    try:
+        results["read_default_files"] = measure(read_defaults, repeat, clear_caches)
+    finally:
+        os.chdir(cwd)
+
+    raw = get_read_func(XLSX_TYPE)(io.BytesIO(uploads[0].getvalue()), skiprows=13, index_col=False)
+    results["clean_dataframe"] = measure(lambda: TRJ1(uploads[0].name, raw.copy()).clean_dataframe(), repeat)
+
+    trj1_list = sort_trj1_list(results["read_default_files"]["result"])
+    results["update_metric_choice"] = measure(
+        lambda: update_metric_choice(trj1_list, "Unique Item Requests"), repeat)
+
+    complete_trj1_list, incomplete_trj1 = set_complete_incomplete_files(trj1_list)
+    if complete_trj1_list and incomplete_trj1:
+        results["project_total_uses"] = measure(
+            lambda: [project_total_uses(complete_trj1_list, trj1) for trj1 in incomplete_trj1], repeat)
+
+    results["usage_distribution"] = measure(
+        lambda: [get_usage_distribution(trj1) for trj1 in trj1_list], repeat, lambda: clear_caches(trj1_list))
+
+    distribution = get_usage_distribution(trj1_list[0])
+    max_value = distribution.max_value()
+    filtered_df = trj1_list[0].get_metric_dataframe(distribution.rows_in_range(1, max_value))
+    results["histogram"] = measure(lambda: histogram(filtered_df, max_value, 500), repeat, clear_caches)
+
+    fiscal_years = [f"FY{i}" for i in range(len(trj1_list))]
+    titles = list(trj1_list[0].get_titles()[:50])
+    results["barChart"] = measure(
+        lambda: barChart(get_title_index(trj1_list, fiscal_years).lookup(titles, trj1_list[0].metric_type)),
+        repeat, clear_caches)
+
+    title_costs = get_title_cost_matrix(trj1_list, trj1_list[0].metric_type)
+    costs = [100000.0] * len(trj1_list)
+
+    def rank_titles():
+        usage, cost = title_costs.allocate(costs, "usage")
+        return (title_ranking(title_costs, usage, cost, 20, largest=True, by="Usage"),
+                title_ranking(title_costs, usage, cost, 20, largest=False, by="Usage"))
+    results["title_ranking"] = measure(rank_titles, repeat)
+
+    for measurement in results.values():
+        del measurement["result"]
+    return results
+
+
+# Returns the stages that are slower or use more memory than in the baseline, beyond tolerance
+def find_regressions(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    regressions = []
+    for stage, measurement in results.items():
+        if stage not in baseline:
+            continue
+        before = baseline[stage]
+        if (measurement["seconds"] >= MIN_COMPARED_SECONDS
+                and measurement["seconds"] > before["seconds"] * (1 + tolerance)):
+            regressions.append(f"{stage}: {before['seconds']:.3f}s -> {measurement['seconds']:.3f}s")
+        if measurement["peak_mb"] > before["peak_mb"] * (1 + tolerance) + 1:
+            regressions.append(f"{stage}: {before['peak_mb']:.1f}MB -> {measurement['peak_mb']:.1f}MB")
+    return regressions
+
+
+def print_results(results: Dict[str, Dict], baseline: Optional[Dict[str, Dict]]) -> None:
+    print(f"{'stage':<22}{'seconds':>10}{'peak MB':>10}" + (f"{'baseline s':>12}{'baseline MB':>13}" if baseline else ""))
+    for stage, measurement in results.items():
+        line = f"{stage:<22}{measurement['seconds']:>10.3f}{measurement['peak_mb']:>10.1f}"
+        if baseline and stage in baseline:
+            line += f"{baseline[stage]['seconds']:>12.3f}{baseline[stage]['peak_mb']:>13.1f}"
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Time each stage of the app on synthetic TR_J1 reports.")
+    parser.add_argument("--titles", type=int, default=2000, help="titles per report (default: %(default)s)")
+    parser.add_argument("--months", type=int, default=12, help="months per full report (default: %(default)s)")
+    parser.add_argument("--files", type=int, default=4, help="number of reports (default: %(default)s)")
+    parser.add_argument("--partial-months", type=int, default=7,
+                        help="months in the last, incomplete report (default: %(default)s)")
+    parser.add_argument("--ingest-workers", type=int, default=1,
+                        help="processes parsing the reports of the read stages, whose memory is only measured "
+                             "with 1 (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the fastest is kept (default: %(default)s)")
+    parser.add_argument("--baseline-file", default=BASELINE_PATH, help="baseline location (default: %(default)s)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    group.add_argument("--baseline", action="store_true", help="compare the results against the stored baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown before a stage counts as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+    config = {"titles": args.titles, "months": args.months, "files": args.files, "partial_months": args.partial_months,
+              "ingest_workers": args.ingest_workers}
+
+    stored = None
+    if args.baseline:
+        try:
+            with open(args.baseline_file) as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as error:
+            print(f"Error: can't read the baseline {args.baseline_file} ({error}). "
+                  "Run with --save-baseline first to store one.", file=sys.stderr)
+            return 2
+
+    # measure parsing rather than reading back the on-disk cache
+    file_cache.DISK_CACHE_DIR = ""
+    helper_fxns.INGEST_WORKERS = args.ingest_workers
+    with tempfile.TemporaryDirectory() as directory:
+        data_dir = os.path.join(directory, "data")
+        os.mkdir(data_dir)
+        paths = write_reports(data_dir, args.titles, args.months, args.files, args.partial_months)
+        # Streamlit warns about calls outside of a running app, which don't matter here
+        with contextlib.redirect_stderr(io.StringIO()):
+            results = run_benchmarks(directory, paths, args.repeat)
+
+    baseline = None
+    if stored:
+        if stored["config"] != config:
+            print(f"Warning: the baseline was measured with {stored['config']}", file=sys.stderr)
+        baseline = stored["results"]
+
+    print_results(results, baseline)
+    if args.save_baseline:
+        with open(args.baseline_file, "w") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+    if baseline:
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
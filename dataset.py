@@ -0,0 +1,125 @@
+# This file contains the per-session set of loaded TR_J1 reports, which is updated from the files of each rerun
+# by parsing only the files that were added and dropping the ones that were removed
+
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, Hashable, List, Tuple
+import pandas as pd
+from helper_fxns import Job, find_overlapping_months, load_sources, sort_trj1_list
+from packages import PACKAGE_GROUPINGS, compare_packages
+from projections import project_total_uses_batch, set_complete_incomplete_files
+from trj1 import TRJ1
+
+
+class Dataset:
+    """
+    Loaded TR_J1 reports of one session, keyed by the cache key of their file, with the structures derived
+    from them kept until the set of files changes
+
+    Attributes
+    ----------
+    files: Dict[Hashable, TRJ1]
+            copy of the TRJ1 of every loaded file, in upload order, keyed by the file's cache key and
+            how many times that file has been listed so far
+    """
+
+    __slots__ = ("files", "_overlaps", "_sorted", "_split", "_projections", "_packages", "_comparison")
+
+    def __init__(self) -> None:
+        self.files: Dict[Hashable, TRJ1] = {}
+        self._overlaps = None
+        self._sorted = None
+        self._split = None
+        self._projections: Dict[str, List[int]] = {}
+        self._packages: Dict[Tuple[str, str], "Dataset"] = {}
+        self._comparison = None
+
+    # Updates the loaded files to those of sources, given as (key, parse job) pairs as returned by upload_sources
+    # or default_sources, loading only new files with load. Returns whether any file was added or removed.
+    def sync(self, sources: List[Tuple[Hashable, Callable[[], Job]]],
+             load: Callable[[List[Tuple[Hashable, Callable[[], Job]]]], List[TRJ1]] = load_sources) -> bool:
+        # a file uploaded twice is loaded twice, as before, so that its overlapping months are reported
+        occurrences = Counter()
+        keys = []
+        for key, _ in sources:
+            occurrences[key] += 1
+            keys.append((key, occurrences[key]))
+        if keys == list(self.files):
+            return False
+
+        kept = set(keys)
+        for key in [key for key in self.files if key not in kept]:
+            del self.files[key]
+        new = [i for i, key in enumerate(keys) if key not in self.files]
+        for i, trj1_file in zip(new, load([sources[i] for i in new])):
+            # the session selects metrics and sets costs on its own copy of the shared TRJ1
+            self.files[keys[i]] = trj1_file.copy()
+        self.files = {key: self.files[key] for key in keys if key in self.files}
+
+        self._sorted = None
+        self._overlaps = None
+        self._split = None
+        self._projections.clear()
+        self._packages.clear()
+        self._comparison = None
+        return True
+
+    # Loaded TRJ1's in chronological order
+    @property
+    def trj1_list(self) -> List[TRJ1]:
+        if self._sorted is None:
+            self._sorted = sort_trj1_list(self.files.values())
+        return self._sorted
+
+    # Returns the months that more than one loaded file has data for, with the names of those files
+    def get_overlapping_months(self) -> Dict[datetime, List[str]]:
+        if self._overlaps is None:
+            self._overlaps = find_overlapping_months(self.trj1_list)
+        return self._overlaps
+
+    # Returns the complete and incomplete fiscal year TRJ1's, see projections.set_complete_incomplete_files
+    def get_complete_incomplete_files(self) -> Tuple[List[TRJ1], List[TRJ1]]:
+        if self._split is None:
+            self._split = set_complete_incomplete_files(self.trj1_list)
+        return self._split
+
+    # Returns the projected usage of every incomplete fiscal year for the selected metric type, which
+    # must already be selected on the TRJ1's. Projections are computed once per metric type and set of files.
+    def get_projections(self, metric_type: str) -> List[int]:
+        if metric_type not in self._projections:
+            self._projections[metric_type] = project_total_uses_batch(*self.get_complete_incomplete_files())
+        return self._projections[metric_type]
+
+    # Returns the name of every package of the loaded files when grouped by "Platform" or "Publisher"
+    def get_package_names(self, by: str) -> List[str]:
+        return sorted({trj1.get_package(by) for trj1 in self.files.values()})
+
+    # Returns the names of the files whose titles have more than one Platform or Publisher, as chosen by by,
+    # which can't be grouped into a package by it
+    def get_mixed_files(self, by: str) -> List[str]:
+        return [trj1.name for trj1 in self.files.values() if trj1.has_mixed_package(by)]
+
+    # Returns the groupings of PACKAGE_GROUPINGS that split the loaded files into several packages, leaving out
+    # the ones no file can be grouped by because every file has titles of several platforms or publishers
+    def get_package_groupings(self) -> List[str]:
+        return [by for by in PACKAGE_GROUPINGS if len(self.get_package_names(by)) > 1
+                and len(self.get_mixed_files(by)) < len(self.files)]
+
+    # Returns the files of one package as a Dataset of their own, sharing this dataset's TRJ1's, so that the
+    # overlapping months, fiscal year split and projections are found for that package only
+    def get_package(self, by: str, package: str) -> "Dataset":
+        if (by, package) not in self._packages:
+            view = Dataset()
+            view.files = {key: trj1 for key, trj1 in self.files.items() if trj1.get_package(by) == package}
+            self._packages[(by, package)] = view
+        return self._packages[(by, package)]
+
+    # Returns the comparison of every package, see packages.compare_packages, recomputed only when the files,
+    # grouping, metric type or costs change
+    def get_package_comparison(self, by: str, metric_type: str,
+                               costs: Dict[Tuple[str, str], float]) -> Tuple[pd.DataFrame, List[str]]:
+        key = (by, metric_type, tuple(sorted(costs.items())))
+        if self._comparison is None or self._comparison[0] != key:
+            packages = {package: self.get_package(by, package).trj1_list for package in self.get_package_names(by)}
+            self._comparison = (key, compare_packages(packages, costs, metric_type))
+        return self._comparison[1]
@@ -0,0 +1,65 @@
+# This file contains the usage distribution index behind the Usage Distribution tabs in app.py
+
+import numpy as np
+from trj1 import TRJ1
+
+
+class UsageDistribution:
+    """
+    Reporting period totals of one TRJ1 and metric type, sorted once so that the titles within a
+    range of totals are found with a binary search instead of filtering the dataframe
+
+    Parameters
+    ----------
+    totals: np.ndarray
+            Reporting_Period_Total of every title, sorted in ascending order
+    rows: np.ndarray
+            TRJ1 row of each entry in totals
+    values: np.ndarray
+            distinct reporting period totals, sorted in ascending order
+    counts: np.ndarray
+            number of titles with each of values
+    """
+
+    __slots__ = ("totals", "rows", "values", "counts")
+
+    def __init__(self, totals: np.ndarray, rows: np.ndarray) -> None:
+        order = np.argsort(totals, kind="stable")  # stable keeps titles with equal totals in report order
+        self.totals = totals[order]
+        self.rows = rows[order]
+        self.values, self.counts = np.unique(self.totals, return_counts=True)
+
+    # Returns the largest reporting period total
+    def max_value(self) -> int:
+        return int(self.values[-1]) if len(self.values) else 0
+
+    # Returns the largest number of titles sharing one reporting period total
+    def max_count(self) -> int:
+        return int(self.counts.max()) if len(self.counts) else 0
+
+    # Returns the position range in totals of the titles with a total from minimum to maximum, inclusive
+    def _range(self, minimum: int, maximum: int) -> slice:
+        return slice(np.searchsorted(self.totals, minimum, side="left"),
+                     np.searchsorted(self.totals, maximum, side="right"))
+
+    # Returns the number of titles with a total from minimum to maximum, inclusive
+    def count_range(self, minimum: int, maximum: int) -> int:
+        positions = self._range(minimum, maximum)
+        return positions.stop - positions.start
+
+    # Returns the TRJ1 rows of the titles with a total from minimum to maximum, inclusive, in report order
+    def rows_in_range(self, minimum: int, maximum: int) -> np.ndarray:
+        return np.sort(self.rows[self._range(minimum, maximum)])
+
+    # Returns the TRJ1 rows of the titles with exactly the given total
+    def rows_for_value(self, value: int) -> np.ndarray:
+        return self.rows[self._range(value, value)]
+
+
+# Returns the usage distribution of the selected metric of trj1, built on first use and then
+# shared by every copy of the TRJ1 so that reruns don't rebuild it
+def get_usage_distribution(trj1: TRJ1) -> UsageDistribution:
+    key = ("usage_distribution", trj1.metric_type)
+    if key not in trj1.derived:
+        trj1.derived[key] = UsageDistribution(trj1.get_reporting_period_totals(), trj1.get_rows())
+    return trj1.derived[key]
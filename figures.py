@@ -1,8 +1,42 @@
+import functools
+import numpy as np
 import pandas as pd
 import altair as alt
 import plotly.express as px
 import streamlit as st
+from file_cache import LRUCache
 
+# Number of recently built figures kept so that reruns with unchanged inputs reuse them
+FIGURE_CACHE_SIZE = 64
+
+figure_cache = LRUCache(FIGURE_CACHE_SIZE)
+
+# Cheap, hashable summary of a figure input: dataframes are reduced to their shape, columns and a
+# vectorized hash of their values, lists to tuples
+def _fingerprint(value):
+    if isinstance(value, pd.DataFrame):
+        return (value.shape, tuple(map(str, value.columns)),
+                int(pd.util.hash_pandas_object(value, index=True).sum()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_fingerprint(item) for item in value)
+    if isinstance(value, dict):
+        return tuple((key, _fingerprint(item)) for key, item in sorted(value.items()))
+    return value
+
+# Decorator that returns the cached figure when a builder is called again with the same inputs.
+# Figures are shared between reruns, so callers must not modify them.
+def memoize_figure(builder):
+    @functools.wraps(builder)
+    def cached_builder(*args, **kwargs):
+        key = (builder.__name__, _fingerprint(args), _fingerprint(kwargs))
+        figure = figure_cache.get(key)
+        if figure is None:
+            figure = builder(*args, **kwargs)
+            figure_cache.put(key, figure)
+        return figure
+    return cached_builder
+
+@memoize_figure
 def linePlot(date_col, cpuDF):
     # Cost per use line graph for all of the attached journals
     cpuData = {
@@ -14,12 +48,23 @@ def linePlot(date_col, cpuDF):
     fig1 = px.line(cpuDataFrame,
                     x="Date Range",
                     y="Cost Per Use")
+    fig1.update_layout(yaxis=dict(range=[0, max(cpuDataFrame["Cost Per Use"]) + 1]))
     return (fig1,cpuDataFrame)
 
+# Above this many journals the histogram is binned in Python instead of sending every journal to the browser
+HISTOGRAM_MAX_ROWS = 2000
+
+# Number of titles listed in the tooltip of each bar of a binned histogram
+HISTOGRAM_TOP_TITLES = 10
+
 #create a histogram showing the distributions of Journals based on the Reporting Period Total
-def histogram(dataframe,filter_max,chartHeight):
+@memoize_figure
+def histogram(dataframe,filter_max,chartHeight,max_rows=HISTOGRAM_MAX_ROWS):
+    if len(dataframe) > max_rows:
+        return binned_histogram(histogram_bins(dataframe), filter_max, chartHeight)
     return (
-        alt.Chart(dataframe)
+        # only the encoded columns are sent to the browser
+        alt.Chart(dataframe[["Title", "Reporting_Period_Total"]])
         .mark_bar(width=3)
         .encode(
             alt.X(
@@ -39,8 +84,53 @@ def histogram(dataframe,filter_max,chartHeight):
         .configure_view(height=chartHeight)
     )
 
+# Counts the journals with each Reporting Period Total, listing the first top_n titles of each bar
+def histogram_bins(dataframe, top_n=HISTOGRAM_TOP_TITLES):
+    totals = dataframe["Reporting_Period_Total"].to_numpy()
+    order = np.argsort(totals, kind="stable")
+    titles = dataframe["Title"].to_numpy()[order]
+    values, starts, counts = np.unique(totals[order], return_index=True, return_counts=True)
+
+    bin_titles = []
+    for start, count in zip(starts, counts):
+        listed = ", ".join(map(str, titles[start:start + min(count, top_n)]))
+        bin_titles.append(listed if count <= top_n else f"{listed} and {count - top_n} more")
+
+    return pd.DataFrame({
+        "Reporting_Period_Total": values,
+        "Count": counts,
+        "Titles": bin_titles,
+    })
+
+# Create a histogram from bins that were already counted, so only one row per bar is sent to the browser
+def binned_histogram(bins,filter_max,chartHeight):
+    return (
+        alt.Chart(bins)
+        .mark_bar(width=3)
+        .encode(
+            alt.X(
+                "Reporting_Period_Total:Q",
+                scale=alt.Scale(domain=[0, filter_max]),
+                title="Reporting Period Total",
+            ),
+            alt.Y(
+                "Count:Q",
+                axis=alt.Axis(grid=False),
+                title="Number of Journals",
+            ),
+            tooltip=[
+                alt.Tooltip("Reporting_Period_Total:Q", title="Reporting Period Total"),
+                alt.Tooltip("Count:Q", title="Number of Journals"),
+                alt.Tooltip("Titles:N", title="Journals"),
+            ],
+        )
+        .interactive()
+        .configure_view(height=chartHeight)
+    )
+
 
 # Create a bar chart with color corresponding to the fiscal years
+@memoize_figure
 def barChart(dataframe):
     return px.bar(
         dataframe,
@@ -63,3 +153,19 @@ def barChart(dataframe):
         },
     )
 
+
+# Create a grouped bar chart comparing one column of the package comparison across packages and fiscal years
+@memoize_figure
+def packageComparisonChart(dataframe, value):
+    return px.bar(
+        dataframe,
+        x="Fiscal_Year",
+        y=value,
+        color="Package",
+        barmode="group",
+        hover_data=["File"],
+        labels={
+            "Fiscal_Year": "Fiscal Year",
+            value: value.replace("_", " "),
+        },
+    )
@@ -0,0 +1,182 @@
+# This file contains the caches that keep app.py from re-parsing TR_J1 reports
+# every time a widget interaction reruns the script
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence, Tuple
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Maximum number of parsed TR_J1 reports kept in memory per server process
+PARSE_CACHE_SIZE = int(os.environ.get("COUNTER_VIZ_PARSE_CACHE_SIZE", "32"))
+
+# Directory for the on-disk cache of cleaned reports, set to an empty string to disable it
+DISK_CACHE_DIR = os.environ.get("COUNTER_VIZ_DISK_CACHE_DIR", "./.trj1_cache")
+
+# Maximum size of the on-disk cache in megabytes, the least recently used files are deleted beyond it
+DISK_CACHE_MAX_MB = float(os.environ.get("COUNTER_VIZ_DISK_CACHE_MAX_MB", "512"))
+
+# Bump whenever the layout of cached reports changes so that older files are ignored
+DISK_CACHE_VERSION = 7
+
+# Key in the Arrow schema metadata holding the TRJ1 fields
+_METADATA_KEY = b"counter_viz"
+
+
+class LRUCache:
+    """
+    Thread-safe mapping with a bounded size that evicts the least recently used entry
+
+    Parameters
+    ----------
+    maxsize: int
+            maximum number of entries kept before the least recently used one is evicted
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Returns the value stored for key and marks it as most recently used
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    # Stores value for key, evicting the least recently used entries over maxsize
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+# Returns the value built from the loaded files trj1_list, from cache when it was already built for the same files
+# and extra key, such as a metric type, otherwise calling build and caching its result. Files are matched on their
+# name and source_hash, and files that were not read through helper_fxns have none, so their values aren't cached.
+def get_or_build(cache: LRUCache, trj1_list: Sequence, extra: Hashable, build: Callable[[], Any]) -> Any:
+    if not all(trj1.source_hash for trj1 in trj1_list):
+        return build()
+    key = (tuple((trj1.name, trj1.source_hash) for trj1 in trj1_list), extra)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.put(key, value)
+    return value
+
+
+# Returns the hex SHA-256 digest of a file's bytes
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+# Key for an uploaded file: its name and a hash of its bytes, so re-uploads of the same report hit the cache
+def content_key(name: str, content: bytes) -> Tuple[str, str]:
+    return (name, content_hash(content))
+
+
+# Key for a file on disk: its path, modification time and size, which avoids hashing on every rerun
+def path_key(path: str) -> Tuple[str, int, int]:
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def _disk_cache_path(digest: str, version: int = DISK_CACHE_VERSION) -> str:
+    return os.path.join(DISK_CACHE_DIR, f"{digest}-v{version}.feather")
+
+
+# Deletes the files of digest written by other versions of the cache, then the least recently used files until
+# the cache fits in DISK_CACHE_MAX_MB. Reads touch their file, so its modification time is its last use.
+def _evict_disk_cache(digest: str) -> None:
+    keep = _disk_cache_path(digest)
+    files = []
+    for entry in os.scandir(DISK_CACHE_DIR):
+        if not entry.name.endswith(".feather") or entry.path == keep:
+            continue
+        try:
+            if entry.name.startswith(f"{digest}-v"):
+                os.remove(entry.path)
+            else:
+                stat = entry.stat()
+                files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        except OSError:
+            # removed by another process, or still open on platforms that don't allow removing open files
+            continue
+
+    size = sum(file_size for _, file_size, _ in files) + os.path.getsize(keep)
+    for _, file_size, path in sorted(files):
+        if size <= DISK_CACHE_MAX_MB * 2 ** 20:
+            break
+        try:
+            os.remove(path)
+            size -= file_size
+        except OSError:
+            continue
+
+
+# Writes an Arrow table and its metadata as an uncompressed Feather file named after the source hash. The table
+# is written as a single record batch, so that every column can be read back as one memory-mapped array.
+def write_disk_cache(digest: str, table: pa.Table, metadata: Dict[str, Any]) -> None:
+    if not DISK_CACHE_DIR:
+        return
+    path = _disk_cache_path(digest)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        table = table.replace_schema_metadata({_METADATA_KEY: json.dumps(metadata, default=str)})
+        os.makedirs(DISK_CACHE_DIR, exist_ok=True)
+        feather.write_feather(table, tmp_path, compression="uncompressed", chunksize=max(table.num_rows, 1))
+        os.replace(tmp_path, path)  # readers never see a partially written file
+        _evict_disk_cache(digest)
+    except (OSError, pa.ArrowException):
+        # caching is an optimization only, the app keeps working from the parsed report
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Memory-maps the cached table for digest, returning it with its metadata or None on a cache miss.
+# The table isn't converted, so its buffers stay backed by the file.
+def read_disk_cache(digest: str) -> Optional[Tuple[pa.Table, Dict[str, Any]]]:
+    if not DISK_CACHE_DIR:
+        return None
+    path = _disk_cache_path(digest)
+    if not os.path.exists(path):
+        return None
+    try:
+        table = feather.read_table(path, memory_map=True)
+        metadata = json.loads(table.schema.metadata[_METADATA_KEY])
+        os.utime(path)  # marks the file as recently used for _evict_disk_cache
+    except (OSError, KeyError, ValueError, pa.ArrowException):
+        return None
+    return (table.replace_schema_metadata(None), metadata)
+
+
+# Cleaned TRJ1 objects shared by every rerun and session of the app
+parse_cache = LRUCache(PARSE_CACHE_SIZE)
+
+# Cleaned TRJ1 objects of the bundled default reports, kept apart from parse_cache so that uploads never evict them
+default_cache = LRUCache(1)
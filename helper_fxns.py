@@ -1,68 +1,312 @@
 from streamlit.runtime.uploaded_file_manager import UploadedFile
 import pandas as pd
-from trj1 import TRJ1
+import numpy as np
+import pyarrow as pa
+from trj1 import METRIC_TYPES, TRJ1, UNUSED_COLUMNS, month_from_ordinal, to_usage_counts
 import streamlit as st
-from typing import List
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+from xlsx_reader import HEADER_ATTR, read_trj1_xlsx
+from file_cache import (content_hash, content_key, default_cache, path_key, parse_cache, read_disk_cache,
+                        write_disk_cache)
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+import csv
+import io
+import multiprocessing
 import os
+import pickle
+import threading
 
 
-# Read files uploaded based on file type
-def read_file(file: UploadedFile, trj1_list: List[TRJ1]) -> pd.DataFrame:
-    read_func = None
-    if file.type == "text/csv":  # csv file
-        read_func = pd.read_csv
-    elif file.type == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet":  # xslx file
-        read_func = pd.read_excel
-    elif file.type == "text/tab-separated-values":  # tsv file
-        read_func = lambda f, **kwargs: pd.read_csv(f, sep='\t', **kwargs)
-    
-    if not read_func:
-        st.warning('Warning: Please upload a file of the correct type as listed above.', icon="⚠️")
-        return pd.DataFrame()
-
-    df = read_func(file, skiprows=13, index_col=False)
-    trj1_file = TRJ1(file.name, df)
-    trj1_file.clean_dataframe()
-    trj1_list.append(trj1_file)
+# Number of rows read at a time from csv/tsv reports
+CSV_CHUNKSIZE = 10000
+
+# A report to parse: its file name, its bytes and the function that reads them
+Job = Tuple[str, bytes, Callable]
+
+# Maximum number of processes used to parse reports in parallel, 1 always parses them one after another
+INGEST_WORKERS = int(os.environ.get("COUNTER_VIZ_INGEST_WORKERS", os.cpu_count() or 1))
+
+# Number of rows of a raw or filtered data view sent to the browser at a time
+DATAFRAME_PAGE_SIZE = int(os.environ.get("COUNTER_VIZ_PAGE_SIZE", "1000"))
+
+_ingest_pool = None
+_ingest_pool_size = 0
+_ingest_pool_lock = threading.Lock()
+_default_files_lock = threading.Lock()
 
+# Reads a csv/tsv TR_J1 report chunk by chunk so that peak memory stays bounded for very large reports.
+# Unused columns are never read, usage counts are stored as int32 and rows of other metric types
+# are dropped per chunk. Month headers are converted to datetimes to match reports read from xlsx.
+def read_csv_chunked(source, sep: str = ",", skiprows: int = 13, index_col=False,
+                     metric_types=METRIC_TYPES, chunksize: int = CSV_CHUNKSIZE) -> pd.DataFrame:
+    report_header = _read_csv_report_header(source, sep, skiprows)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    header = pd.read_csv(source, sep=sep, skiprows=skiprows, index_col=index_col, nrows=0).columns
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+    usecols = [column for column in header if column not in UNUSED_COLUMNS]
+    # COUNTER reports list the months after the Reporting_Period_Total column
+    months = list(header[header.get_loc("Reporting_Period_Total") + 1:])
+    counts = ["Reporting_Period_Total", *months]
+    dtypes = {column: ("float64" if column in counts else "object") for column in usecols}
+
+    chunks = []
+    for chunk in pd.read_csv(source, sep=sep, skiprows=skiprows, index_col=index_col,
+                             usecols=usecols, dtype=dtypes, chunksize=chunksize):
+        chunk = chunk[chunk["Metric_Type"].isin(metric_types)].copy()
+        for column in counts:
+            chunk[column] = to_usage_counts(chunk[column], column)
+        chunks.append(chunk)
+
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=usecols)
+    df["Metric_Type"] = df["Metric_Type"].astype("category")
+    df.columns = [*df.columns[:len(df.columns) - len(months)], *(_parse_month(month) for month in months)]
+    df.attrs[HEADER_ATTR] = report_header
     return df
 
-# Read default files at start of page/when no files are uploaded
-def read_default_files(trj1_list: List[TRJ1]) -> pd.DataFrame:
+# Reads the COUNTER header block of the first skiprows lines of a csv/tsv report, the names in the first
+# column and their values in the second, as read_trj1_xlsx does for xlsx reports
+def _read_csv_report_header(source, sep: str, skiprows: int) -> Dict[str, str]:
+    if hasattr(source, "readline"):
+        lines = [source.readline() for _ in range(skiprows)]
+    else:
+        with open(source, "rb") as f:
+            lines = [f.readline() for _ in range(skiprows)]
+    lines = [line.decode("utf-8-sig", errors="replace") if isinstance(line, bytes) else line for line in lines]
+    return {row[0].strip(): (row[1].strip() if len(row) > 1 else "")
+            for row in csv.reader(lines, delimiter=sep) if row and row[0].strip()}
+
+# Converts a month header such as "Jul-2019" to a datetime, leaving it unchanged if it isn't a date
+def _parse_month(header):
+    try:
+        return pd.to_datetime(header).to_pydatetime()
+    except (ValueError, TypeError):
+        return header
+
+# Returns the function used to read a file of the given MIME type, None if unsupported
+def get_read_func(file_type: str) -> Optional[Callable]:
+    if file_type == "text/csv":  # csv file
+        return read_csv_chunked
+    elif file_type == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet":  # xslx file
+        return read_trj1_xlsx
+    elif file_type == "text/tab-separated-values":  # tsv file
+        return partial(read_csv_chunked, sep='\t')
+    return None
+
+# Reads a TR_J1 report from a path or buffer and returns it as a cleaned TRJ1 object
+def parse_trj1(name: str, source, read_func: Callable) -> TRJ1:
+    df = read_func(source, skiprows=13, index_col=False)
+    trj1_file = TRJ1(name, df, report_header=df.attrs.get(HEADER_ATTR))
+    trj1_file.clean_dataframe()
+    return trj1_file
+
+# Returns the cleaned TRJ1 for a report's bytes, from the on-disk cache when the same bytes were parsed before
+def load_trj1(name: str, content: bytes, read_func: Callable) -> TRJ1:
+    digest = content_hash(content)
+    cached = read_disk_cache(digest)
+    if cached is not None:
+        table, fields = cached
+        return TRJ1.from_cache_table(name, table, fields, source_hash=digest)
+
+    trj1_file = parse_trj1(name, io.BytesIO(content), read_func)
+    trj1_file.source_hash = digest
+    try:
+        write_disk_cache(digest, *trj1_file.get_cache_table())
+    except pa.ArrowException:
+        pass  # identifiers Arrow can't store in one column, such as numbers mixed with text, are left uncached
+    return trj1_file
+
+# Returns the process pool used to parse reports in parallel, kept between reruns so that
+# worker start-up is only paid once per server process
+def _get_ingest_pool(max_workers: int) -> ProcessPoolExecutor:
+    global _ingest_pool, _ingest_pool_size
+    with _ingest_pool_lock:
+        if _ingest_pool is None or _ingest_pool_size != max_workers:
+            if _ingest_pool is not None:
+                _ingest_pool.shutdown(wait=False)
+            # spawn instead of fork, since forking Streamlit's multi-threaded server is unsafe
+            _ingest_pool = ProcessPoolExecutor(max_workers=max_workers,
+                                               mp_context=multiprocessing.get_context("spawn"))
+            _ingest_pool_size = max_workers
+        return _ingest_pool
+
+# Shuts down pool and drops it, unless another thread has already replaced it, so that the next
+# _get_ingest_pool starts new workers
+def _reset_ingest_pool(pool: ProcessPoolExecutor) -> None:
+    global _ingest_pool, _ingest_pool_size
+    with _ingest_pool_lock:
+        if _ingest_pool is pool:
+            _ingest_pool = None
+            _ingest_pool_size = 0
+    pool.shutdown(wait=False, cancel_futures=True)
+
+# Loads several reports, given as (name, content, read_func) tuples, in a process pool of max_workers processes,
+# INGEST_WORKERS by default, when there is more than one to parse. TRJ1's are returned in the same order as jobs.
+def load_trj1_many(jobs: List[Job], max_workers: Optional[int] = None) -> List[TRJ1]:
+    if max_workers is None:
+        max_workers = INGEST_WORKERS
+    if max_workers <= 1 or len(jobs) <= 1:
+        return [load_trj1(*job) for job in jobs]
+
+    pool = None
+    try:
+        pool = _get_ingest_pool(max_workers)
+        return list(pool.map(load_trj1, *zip(*jobs)))
+    except (BrokenProcessPool, OSError):
+        # worker processes can't be started or have died, parse in this process instead
+        if pool is not None:
+            _reset_ingest_pool(pool)
+        return [load_trj1(*job) for job in jobs]
+    except pickle.PicklingError:
+        # the pool still works, only these jobs can't be sent to it
+        return [load_trj1(*job) for job in jobs]
+
+# Decorator for a part of the page that reruns on its own when one of its widgets changes, instead of the whole
+# script. Streamlit versions without fragments rerun the whole script, as before.
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
+# Returns the cache key of every uploaded file of a supported type, with a function returning its parse job
+def upload_sources(files: List[UploadedFile]) -> List[Tuple[Hashable, Callable[[], Job]]]:
+    sources = []
+    for file in files:
+        read_func = get_read_func(file.type)
+        if not read_func:
+            st.warning('Warning: Please upload a file of the correct type as listed above.', icon="⚠️")
+            continue
+        sources.append((content_key(file.name, file.getvalue()), partial(_read_upload, file, read_func)))
+    return sources
+
+def _read_upload(file: UploadedFile, read_func: Callable) -> Job:
+    return (file.name, file.getvalue(), read_func)
+
+# Returns the cache key of every default file in ./data, with a function that reads it only when it isn't cached
+def default_sources() -> List[Tuple[Hashable, Callable[[], Job]]]:
+    sources = []
     for file in os.listdir("./data"):
-        df = pd.read_excel("./data/" + file,
-                                skiprows=13,
-                                index_col=False)  # use default data
-        trj1_file = TRJ1(file, df)
-        trj1_file.clean_dataframe()
-        trj1_list.append(trj1_file)
-    return df
+        path = "./data/" + file
+        sources.append((path_key(path), partial(_read_default_file, file, path)))
+    return sources
+
+def _read_default_file(file: str, path: str) -> Job:
+    with open(path, "rb") as f:
+        return (file, f.read(), read_trj1_xlsx)  # use default data
+
+# Returns the cleaned TRJ1 of every source, from the parse cache when possible and parsing the others in parallel.
+# The TRJ1's are shared through the cache, so callers copy them before changing their metric or costs.
+def load_sources(sources: List[Tuple[Hashable, Callable[[], Job]]]) -> List[TRJ1]:
+    cached = [parse_cache.get(key) for key, _ in sources]
+    parsed = iter(load_trj1_many([get_job() for (_, get_job), trj1_file in zip(sources, cached)
+                                  if trj1_file is None]))
+    trj1_files = []
+    for (key, _), trj1_file in zip(sources, cached):
+        if trj1_file is None:
+            trj1_file = next(parsed)
+            trj1_file.freeze()
+            parse_cache.put(key, trj1_file)
+        trj1_files.append(trj1_file)
+    return trj1_files
+
+# Returns the cleaned TRJ1 of every default file, loaded once per server process and shared read-only by every
+# session. Sessions that open the app at the same time wait for one of them to load the files instead of each
+# parsing them.
+def load_default_files(sources: List[Tuple[Hashable, Callable[[], Job]]]) -> List[TRJ1]:
+    key = tuple(key for key, _ in sources)
+    with _default_files_lock:
+        trj1_files = default_cache.get(key)
+        if trj1_files is None:
+            trj1_files = tuple(load_sources(sources))
+            default_cache.put(key, trj1_files)
+    return list(trj1_files)
+
+# Read files uploaded based on file type, reusing cached TRJ1's and parsing the others in parallel
+def read_files(files: List[UploadedFile], trj1_list: List[TRJ1]) -> List[TRJ1]:
+    return _append_trj1s(load_sources(upload_sources(files)), trj1_list)
+
+# Read one uploaded file based on file type
+def read_file(file: UploadedFile, trj1_list: List[TRJ1]) -> List[TRJ1]:
+    return read_files([file], trj1_list)
 
-# Metric choice is updated based on the radio option in app.py
+# Read default files at start of page/when no files are uploaded
+def read_default_files(trj1_list: List[TRJ1]) -> List[TRJ1]:
+    return _append_trj1s(load_default_files(default_sources()), trj1_list)
+
+# Appends a copy of every TRJ1 to trj1_list and returns trj1_list. The dataframe of a file is only rebuilt
+# when it is asked for, through TRJ1.dataframe.
+def _append_trj1s(trj1_files: List[TRJ1], trj1_list: List[TRJ1]) -> List[TRJ1]:
+    trj1_list.extend(trj1_file.copy() for trj1_file in trj1_files)
+    return trj1_list
+
+# Shows one page of a table of row_count rows, built by get_rows from a slice of its rows, with a page selector.
+# Only the rows of the selected page are built and sent to the browser.
+def paginated_dataframe(row_count: int, get_rows: Callable[[slice], pd.DataFrame], key: str,
+                        page_size: int = DATAFRAME_PAGE_SIZE, **dataframe_kwargs) -> None:
+    pages = max(1, -(-row_count // page_size))
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages}, {page_size} rows per page)", min_value=1, max_value=pages, key=key)
+    start = (page - 1) * page_size
+    st.dataframe(get_rows(slice(start, min(start + page_size, row_count))), **dataframe_kwargs)
+
+# Metric choice is updated based on the radio option in app.py, switching only selects the other prebuilt view
 def update_metric_choice(trj1_list: List[TRJ1], metric_choice: str) -> List[TRJ1]:
     metric_type = "Unique_Item_Requests" if metric_choice == "Unique Item Requests" else "Total_Item_Requests"
     for trj1 in trj1_list:
-        trj1.dataframe = trj1.dataframe[trj1.dataframe["Metric_Type"] == metric_type].drop(columns=["Metric_Type"])
-        trj1.set_reporting_period_total()
+        trj1.select_metric(metric_type)
     return trj1_list
 
 # Sort List of TRJ1 objects in chronological order
 def sort_trj1_list(unsorted_trj1_list: List[TRJ1]) -> List[TRJ1]:
     return sorted(unsorted_trj1_list, key=lambda x: x.start_date)
 
-# Checks if files have data for the same month, can be updated to say which files possibly
+# Returns the months that more than one file has data for, each with the names of those files. The months of
+# every file are compared as month ordinals, so no header is parsed.
+def find_overlapping_months(trj1_list: List[TRJ1]) -> Dict[datetime, List[str]]:
+    ordinals = [trj1_file.get_month_ordinals() for trj1_file in trj1_list]
+    all_months = np.concatenate(ordinals) if ordinals else np.empty(0, dtype=np.int64)
+    files = np.repeat(np.arange(len(trj1_list)), [len(months) for months in ordinals])
+    months, counts = np.unique(all_months, return_counts=True)
+    overlapping = np.isin(all_months, months[counts > 1])
+
+    overlaps = {}
+    for month, file in sorted(zip(all_months[overlapping].tolist(), files[overlapping].tolist())):
+        overlaps.setdefault(month_from_ordinal(month), []).append(trj1_list[file].name)
+    return overlaps
+
+# Checks if files have data for the same month, and says which files and months
 def check_duplicate_dates(trj1_list) -> None:
-    all_dates = []
-    dates_set = set()
+    overlaps = find_overlapping_months(trj1_list)
+    if overlaps:
+        warn_duplicate_dates(overlaps)
 
-    for trj1_file in trj1_list:
-        all_dates.extend(trj1_file.get_header_dates())
-        file_date_set = set(trj1_file.get_header_dates())
-        dates_set = dates_set.union(file_date_set)
+# Warns about the overlapping months found by find_overlapping_months, listing the months shared by each group of files
+def warn_duplicate_dates(overlaps: Dict[datetime, List[str]]) -> None:
+    months_by_files = {}
+    for month, files in overlaps.items():
+        months_by_files.setdefault(tuple(files), []).append(month.strftime("%m/%Y"))
+    details = "".join(f"\n- {', '.join(files)}: {', '.join(months)}" for files, months in months_by_files.items())
+    st.warning('Warning: Two or more of your files contain data for the same month. \
+                To compare data across time periods, please upload non-ovelapping TR_J1 reports.' + details,
+                icon="⚠️")
 
-    if len(dates_set) != len(all_dates):
-        st.warning('Warning: Two or more of your files contain data for the same month. \
-                    To compare data across time periods, please upload non-ovelapping TR_J1 reports.',
+# Warns about reports whose header disagrees with their usage columns, and about reports of different institutions
+def check_report_headers(trj1_list: List[TRJ1]) -> None:
+    issues = "".join(f"\n- {trj1_file.name}: {issue}" for trj1_file in trj1_list for issue in trj1_file.header_issues)
+    if issues:
+        st.warning('Warning: The header of some of your files does not match their data. \
+                    Usage is taken from the monthly columns of each file.' + issues, icon="⚠️")
+    institutions = {}
+    for trj1_file in trj1_list:
+        if trj1_file.institution_id:
+            institutions.setdefault(trj1_file.institution_id, []).append(trj1_file.name)
+    if len(institutions) > 1:
+        details = "".join(f"\n- {institution}: {', '.join(files)}" for institution, files in institutions.items())
+        st.warning('Warning: Your files are for different institutions. \
+                    To compare data across time periods, please upload reports of one institution.' + details,
                     icon="⚠️")
 
 # If there exists a file with < 12 months of data, send warning once.
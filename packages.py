@@ -0,0 +1,119 @@
+# This file contains the per-package calculations shared by the batch mode and the package comparison of the app.
+# The usage, projections and cost per use of each package are computed with the same calculations as the
+# cost per use sidebar, and several packages are processed at once.
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from distribution import get_usage_distribution
+from helper_fxns import INGEST_WORKERS, sort_trj1_list
+from projections import diff_month, project_total_uses_batch, set_complete_incomplete_files
+from trj1 import TRJ1
+
+# Report columns that uploaded files can be grouped into packages by
+PACKAGE_GROUPINGS = ("Platform", "Publisher")
+
+# Maximum number of packages compared at the same time in the app
+PACKAGE_WORKERS = int(os.environ.get("COUNTER_VIZ_PACKAGE_WORKERS", INGEST_WORKERS))
+
+# Columns of the consolidated report, one row per TR_J1 report
+REPORT_COLUMNS = ["Package", "File", "Start_Date", "End_Date", "Months", "Full_FY", "Metric_Type",
+                  "Reporting_Period_Total", "Projected_Usage", "Cost", "Cost_Per_Use", "Projected_Cost_Per_Use"]
+
+# Columns of the package comparison, the report columns with the size and median use of each report's titles
+COMPARISON_COLUMNS = [*REPORT_COLUMNS, "Titles", "Median_Use"]
+
+
+# Reads a costs csv with the columns Package, File and Cost into a mapping from (package, file name) to the
+# cost of that report. source is a path or an uploaded file.
+def read_costs(source) -> Dict[Tuple[str, str], float]:
+    costs = pd.read_csv(source, dtype={"Package": str, "File": str})
+    missing = {"Package", "File", "Cost"}.difference(costs.columns)
+    if missing:
+        raise ValueError(f"{getattr(source, 'name', source)} is missing the column(s) {', '.join(sorted(missing))}")
+    return {(row.Package, row.File): float(row.Cost) for row in costs.itertuples(index=False)
+            if pd.notna(row.Cost)}
+
+
+# Computes the report rows of one package, using the same calculations as the cost per use sidebar of the app.
+# The metric and costs are set on the given TRJ1's, so callers that keep them pass copies.
+def summarize_package(package: str, trj1_list: List[TRJ1], costs: Dict[str, float], metric_type: str) -> List[dict]:
+    trj1_list = sort_trj1_list(trj1_list)
+    for trj1 in trj1_list:
+        if metric_type not in trj1.metric_types:
+            raise ValueError(f"{trj1.name} has no {metric_type} rows")
+        trj1.select_metric(metric_type)
+
+    complete_trj1_list, incomplete_trj1 = set_complete_incomplete_files(trj1_list)
+    # projections need at least one complete fiscal year to take the monthly pattern of use from
+    if complete_trj1_list:
+        projections = project_total_uses_batch(complete_trj1_list, incomplete_trj1)
+        for incomplete, projection in zip(incomplete_trj1, projections):
+            incomplete.set_projected_usage(projection)
+
+    rows = []
+    for trj1 in trj1_list:
+        cost = costs.get(trj1.name)
+        if cost and trj1.is_Full_FY() and trj1.rpt:
+            trj1.set_cost_per_use(cost)
+        elif cost and not trj1.is_Full_FY() and trj1.projected_usage:
+            trj1.set_projected_cost_per_use(cost)
+        totals = get_usage_distribution(trj1).totals
+        rows.append({
+            "Package": package,
+            "File": trj1.name,
+            "Start_Date": trj1.start_date.strftime("%m/%Y"),
+            "End_Date": trj1.end_date.strftime("%m/%Y"),
+            "Months": diff_month(trj1),
+            "Full_FY": trj1.is_Full_FY(),
+            "Metric_Type": metric_type,
+            "Reporting_Period_Total": int(trj1.rpt),
+            "Projected_Usage": trj1.projected_usage,
+            "Cost": cost,
+            "Cost_Per_Use": trj1.cpu,
+            "Projected_Cost_Per_Use": trj1.projected_cpu,
+            "Titles": len(totals),
+            "Median_Use": float(np.median(totals)) if len(totals) else None,
+        })
+    return rows
+
+
+# Runs summarize_package, returning the error message instead of raising so one bad package doesn't stop the others.
+# When load is given, trj1_list holds what load reads a TRJ1 from, such as the report paths of the batch mode,
+# so that a report that can't be read fails its package like any other error.
+def summarize_package_safely(package: str, trj1_list: List, costs: Dict[str, float], metric_type: str,
+                             load: Optional[Callable[[Any], TRJ1]] = None) -> Tuple[List[dict], Optional[str]]:
+    try:
+        if load is not None:
+            trj1_list = [load(item) for item in trj1_list]
+        return (summarize_package(package, trj1_list, costs, metric_type), None)
+    except Exception as error:
+        return ([], f"{package}: {error}")
+
+
+# Builds one table of report rows from the results of summarize_package_safely, with the errors of packages that failed
+def combine_summaries(results: List[Tuple[List[dict], Optional[str]]],
+                      columns: List[str] = COMPARISON_COLUMNS) -> Tuple[pd.DataFrame, List[str]]:
+    rows = [row for package_rows, _ in results for row in package_rows]
+    errors = [error for _, error in results if error]
+    # nullable integers, since only incomplete fiscal years have a projected usage
+    return (pd.DataFrame(rows, columns=columns).astype({"Projected_Usage": "Int64"}), errors)
+
+
+# Compares already loaded packages for one metric type, summarizing up to max_workers packages at the same time.
+# Threads are used rather than the process pool of the batch mode since the reports are already in memory,
+# where the NumPy calculations run without holding the GIL, and sending them to processes would cost more than
+# the calculations. costs maps (package, file name) to the cost of a report.
+def compare_packages(packages: Dict[str, List[TRJ1]], costs: Dict[Tuple[str, Hashable], float], metric_type: str,
+                     max_workers: int = PACKAGE_WORKERS) -> Tuple[pd.DataFrame, List[str]]:
+    jobs = [(package, [trj1.copy() for trj1 in trj1_list],
+             {file: cost for (cost_package, file), cost in costs.items() if cost_package == package}, metric_type)
+            for package, trj1_list in packages.items()]
+    if max_workers <= 1 or len(jobs) <= 1:
+        results = [summarize_package_safely(*job) for job in jobs]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(summarize_package_safely, *zip(*jobs)))
+    return combine_summaries(results)
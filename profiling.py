@@ -0,0 +1,190 @@
+# This file contains the opt-in profiler that times each stage of a rerun of app.py. It is enabled by
+# setting COUNTER_VIZ_PROFILE=1 or by opening the app with ?profile=1, and shows its breakdown in the sidebar.
+
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+import pandas as pd
+import streamlit as st
+
+# Set to 1 to profile every rerun of every session
+PROFILE_ENABLED = os.environ.get("COUNTER_VIZ_PROFILE", "") not in ("", "0")
+
+# File that every profiled rerun is appended to as one line of JSON, set to an empty string to disable it
+PROFILE_LOG = os.environ.get("COUNTER_VIZ_PROFILE_LOG", "./counter_viz_profile.jsonl")
+
+# Query parameter that turns profiling on for one session
+PROFILE_QUERY_PARAM = "profile"
+
+_log_lock = threading.Lock()
+
+# tracemalloc is shared by every session of the process, so it is started by the first stage measured and
+# stopped by the last one to finish, under _tracing_lock. _stages_started tells a stage whether another
+# one started while it ran, in which case the peak it sees isn't its own.
+_tracing_lock = threading.Lock()
+_active_stages = 0
+_stages_started = 0
+_started_tracing = False
+
+
+# Starts tracing memory unless another stage already has, and returns whether no other stage is running
+# along with the count of stages started so far
+def _start_tracing() -> Tuple[bool, int]:
+    global _active_stages, _stages_started, _started_tracing
+    with _tracing_lock:
+        if _active_stages == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _active_stages += 1
+        _stages_started += 1
+        alone = _active_stages == 1
+        if alone:
+            tracemalloc.reset_peak()
+        return (alone, _stages_started)
+
+
+# Returns the traced memory at the end of a stage and whether the stage ran alone throughout, then stops
+# tracing when the stage is the last one running and tracing was started by a stage
+def _stop_tracing(alone: bool, started: int) -> Tuple[int, int, bool]:
+    global _active_stages, _started_tracing
+    with _tracing_lock:
+        allocated, peak = tracemalloc.get_traced_memory()
+        alone = alone and _stages_started == started
+        _active_stages -= 1
+        if _active_stages == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+        return (allocated, peak, alone)
+
+
+class RerunProfiler:
+    """
+    Wall time and Python memory of the stages of one rerun of app.py, or of one part of the page that reruns
+    on its own. When disabled, or once finished, stage() does nothing, so the parts of the page that rerun on
+    their own are measured by the profiler for_fragment returns.
+    Memory is traced for the whole process, so a stage that overlaps a stage of another session has no
+    peak_mb and its allocated_mb includes the other session's allocations.
+
+    Parameters
+    ----------
+    enabled: bool
+            whether stages are measured
+    fragment: str, default None
+            name of the part of the page measured, None for the whole rerun
+    full_run: RerunProfiler, default None
+            profiler of the full rerun the fragment belongs to. While that rerun is still going, the fragment's
+            stages are added to it, otherwise they are shown and logged on their own with its rerun_id.
+    """
+
+    def __init__(self, enabled: bool, fragment: Optional[str] = None,
+                 full_run: Optional["RerunProfiler"] = None) -> None:
+        self.enabled = enabled
+        self.fragment = fragment
+        self.full_run = full_run
+        self.rerun_id = uuid.uuid4().hex
+        self._joined = full_run if full_run is not None and not full_run._finished else None
+        self.started = time.perf_counter()
+        self.stages: List[dict] = []
+        self._finished = False
+
+    # Context manager measuring the wall time, net allocated memory and peak memory of the code it wraps
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if not self.enabled or self._finished:
+            yield
+            return
+        if self._joined is not None:
+            with self._joined.stage(name):
+                yield
+            return
+        alone, started = _start_tracing()
+        allocated_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            allocated, peak, alone = _stop_tracing(alone, started)
+            self.stages.append({
+                "stage": name,
+                "seconds": round(seconds, 6),
+                "allocated_mb": round((allocated - allocated_before) / 2 ** 20, 3),
+                "peak_mb": round((peak - allocated_before) / 2 ** 20, 3) if alone else None,
+            })
+
+    # Stage timings as a dataframe, with the whole rerun as the last row
+    def summary(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.stages, columns=["stage", "seconds", "allocated_mb", "peak_mb"])
+        total = {"stage": "total", "seconds": round(time.perf_counter() - self.started, 6),
+                 "allocated_mb": df["allocated_mb"].sum(), "peak_mb": df["peak_mb"].max()}
+        return pd.concat([df, pd.DataFrame([total])], ignore_index=True).set_index("stage")
+
+    # Shows the stage breakdown in a sidebar expander, or below the fragment measured since fragments
+    # can't write to the sidebar
+    def render(self) -> None:
+        if not self.enabled:
+            return
+        if self.fragment is None:
+            container = st.sidebar.expander("Profiling: time and memory of this rerun", expanded=True)
+        else:
+            container = st.expander(f"Profiling: time and memory of the last {self.fragment} update")
+        with container:
+            st.dataframe(self.summary(), use_container_width=True)
+            if PROFILE_LOG:
+                st.caption(f"Every profiled rerun is appended to {PROFILE_LOG}")
+
+    # Appends the stages of this rerun to the profile log as one line of JSON
+    def write_log(self, path: Optional[str] = PROFILE_LOG) -> None:
+        if not self.enabled or not path:
+            return
+        record = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "pid": os.getpid(),
+            "rerun_id": self.rerun_id,
+            "fragment": self.fragment,
+            "full_rerun_id": self.full_run.rerun_id if self.full_run is not None else None,
+            "total_seconds": round(time.perf_counter() - self.started, 6),
+            "stages": self.stages,
+        }
+        try:
+            with _log_lock, open(path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError:
+            # the log is for offline analysis only, the app keeps working without it
+            pass
+
+    # Returns the profiler of the fragment named name, see full_run
+    def for_fragment(self, name: str) -> "RerunProfiler":
+        return RerunProfiler(self.enabled, name, self)
+
+    # Shows and logs the stages at the end of the rerun
+    def finish(self) -> None:
+        if not self.enabled:
+            return
+        self._finished = True
+        # fragments of a full rerun are shown and logged with it, and the ones that returned before
+        # measuring anything are left out
+        if self._joined is not None or (self.fragment is not None and not self.stages):
+            return
+        self.render()
+        self.write_log()
+
+
+# Returns whether profiling was turned on for this session with ?profile=1
+def _profile_query_param() -> bool:
+    if hasattr(st, "query_params"):
+        value = st.query_params.get(PROFILE_QUERY_PARAM, "")
+    else:  # Streamlit versions before 1.30
+        value = (st.experimental_get_query_params().get(PROFILE_QUERY_PARAM) or [""])[0]
+    return value not in ("", "0")
+
+
+# Returns the profiler of the current rerun, enabled by COUNTER_VIZ_PROFILE or the profile query parameter
+def start_profiler() -> RerunProfiler:
+    return RerunProfiler(PROFILE_ENABLED or _profile_query_param())
@@ -1,10 +1,12 @@
 # This file contains all of the functions that calculate the projected usage
 # for a TRJ1 with an incomplete Fiscal Year
 
-from datetime import datetime
-import pandas as pd
+import numpy as np
 from typing import List, Tuple
-from trj1 import TRJ1
+from trj1 import TRJ1, month_from_ordinal, month_ordinal
+
+# Last month of a fiscal year
+FISCAL_YEAR_END_MONTH = 6
 
 # Identify complete files and the single incomplete trj1
 def set_complete_incomplete_files(trj1_list: List[TRJ1]) -> Tuple[List[TRJ1], List[TRJ1]]:
@@ -25,29 +27,16 @@ def set_complete_incomplete_files(trj1_list: List[TRJ1]) -> Tuple[List[TRJ1], Li
 # TOTAL USAGE: over the course of the year is simply <trj1.rpt> -- #1
 # Returns the count of months from end_date to start_date
 def diff_month(trj1: TRJ1) -> int:
-    return (trj1.end_date.year - trj1.start_date.year) * 12 + trj1.end_date.month - trj1.start_date.month + 1 # +1 for the offset
-
-# Find usage up to month x -- #2 (this will be used)
-def usage_up_to_month(month: int, df: pd.DataFrame) -> int:
-    usage = 0
-    month_count = 0
+    return month_ordinal(trj1.end_date) - month_ordinal(trj1.start_date) + 1 # +1 for the offset
 
-    for columnName, columnData in df.items():
-        if type(columnName) == datetime:
-            if month_count < month:
-                usage += columnData.values.sum()
-                # st.write(columnName.strftime("%m/%Y"))
-                # st.write((columnData.values.sum()))
-                month_count += 1
-            # else:
-                # ttt = columnName.strftime("%m/%Y")
-                # st.write("Not Calculated: ", columnName.strftime("%m/%Y"))
-            # if month_count >= months_completed:
-            #     st.write(columnName.strftime("%m/%Y"))
-            #     st.write((columnData.values.sum()))
-            # else:
-            #     month_count += 1
-    return usage
+# Returns the usage of all titles per month for each TRJ1 as a (files x months) matrix. Files with
+# fewer months are padded with zeros, so cumulative sums past their last month stay at their total.
+def monthly_usage_matrix(trj1_list: List[TRJ1]) -> np.ndarray:
+    monthly_totals = [trj1.get_monthly_totals() for trj1 in trj1_list]
+    matrix = np.zeros((len(monthly_totals), max(map(len, monthly_totals), default=0)), dtype=np.int64)
+    for i, totals in enumerate(monthly_totals):
+        matrix[i, :len(totals)] = totals
+    return matrix
 
 # params: (usage up to month, rpt--total usage)
 def fraction_of_total_uses(usage: int, total_usage: int) -> float:
@@ -56,34 +45,34 @@ def fraction_of_total_uses(usage: int, total_usage: int) -> float:
     # print(round(x, 3)) 		#output: 6.346
     # print(round(x, 1)  		#output: 6.3
     return usage / total_usage
-# Calculates projected usage for the given incomplete FY TRJ1, given List of complete TRJ1's
-def project_total_uses(complete_trj1_list: List, incomplete_trj1: TRJ1) -> int:
-    fraction = 0.0
-    months_completed = diff_month(incomplete_trj1)
-
-    for trj1 in complete_trj1_list:
-        usage = usage_up_to_month(months_completed, trj1.dataframe)
-        fraction += fraction_of_total_uses(usage, trj1.rpt)
+# Calculates projected usage for every incomplete FY TRJ1 at once, given List of complete TRJ1's.
+# One cumulative sum over the (years x months) usage matrix gives the fraction of each complete year's
+# total used by every month, which is averaged over the years and looked up for each incomplete TRJ1.
+def project_total_uses_batch(complete_trj1_list: List[TRJ1], incomplete_trj1_list: List[TRJ1]) -> List[int]:
+    if not incomplete_trj1_list:
+        return []
+    if not complete_trj1_list:
+        raise ValueError("Projecting usage requires at least one complete fiscal year")
 
-    average_fraction = fraction/len(complete_trj1_list)
-    projected_total = round(incomplete_trj1.rpt / average_fraction)
+    cumulative_usage = np.cumsum(monthly_usage_matrix(complete_trj1_list), axis=1)
+    total_usage = np.array([trj1.rpt for trj1 in complete_trj1_list], dtype=np.float64)
+    average_fraction = fraction_of_total_uses(cumulative_usage, total_usage[:, np.newaxis]).mean(axis=0)
 
-    return projected_total
+    months_completed = np.array([diff_month(trj1) for trj1 in incomplete_trj1_list])
+    # past the last month of the complete years, the whole year has been used
+    month_index = np.minimum(months_completed, len(average_fraction)) - 1
+    incomplete_usage = np.array([trj1.rpt for trj1 in incomplete_trj1_list], dtype=np.float64)
+    projected_totals = np.round(incomplete_usage / average_fraction[month_index])
 
-# Function can be used to display to user which months are missing within the Fiscal Year
-def calculate_remaining_months(incomplete_trj1: TRJ1) -> List[str]:
-    # Create a list to save the projections missing 
-    remaining_months = []
-    month = incomplete_trj1.end_date.month
-    year = incomplete_trj1.end_date.year
+    return [int(total) for total in projected_totals]
 
-    while month < 6:
-        if month <= 12:
-            month += 1
-        else:
-            month = 1
-            year += 1
-
-        remaining_months.append(f"{month}/{year}")
+# Calculates projected usage for the given incomplete FY TRJ1, given List of complete TRJ1's
+def project_total_uses(complete_trj1_list: List, incomplete_trj1: TRJ1) -> int:
+    return project_total_uses_batch(complete_trj1_list, [incomplete_trj1])[0]
 
-    return remaining_months
+# Function can be used to display to user which months are missing within the Fiscal Year,
+# from the month after end_date up to the end of the fiscal year
+def calculate_remaining_months(incomplete_trj1: TRJ1) -> List[str]:
+    end = month_ordinal(incomplete_trj1.end_date)
+    fiscal_year_end = end + (FISCAL_YEAR_END_MONTH - 1 - end) % 12
+    return [f"{month.month}/{month.year}" for month in map(month_from_ordinal, range(end + 1, fiscal_year_end + 1))]
@@ -0,0 +1,55 @@
+# Checks that csv and tsv reports are read like the same reports in xlsx, and that counts are read exactly
+
+import glob
+import io
+import os
+from functools import partial
+import numpy as np
+import pandas as pd
+import pytest
+from helper_fxns import parse_trj1, read_csv_chunked
+from xlsx_reader import read_trj1_xlsx
+
+DATA_PATHS = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                           "data", "*.xlsx")))
+
+ARRAYS = ("title_ids", "months", "usage", "totals", "present", "period_totals", "monthly_totals")
+
+
+# Returns the whole first sheet of an xlsx report, header block included, as csv text
+def to_text(path: str, sep: str) -> str:
+    return pd.read_excel(path, header=None).to_csv(sep=sep, header=False, index=False)
+
+
+@pytest.mark.parametrize("sep", [",", "\t"], ids=["csv", "tsv"])
+@pytest.mark.parametrize("path", DATA_PATHS, ids=os.path.basename)
+def test_round_trip_matches_xlsx(path: str, sep: str) -> None:
+    expected = parse_trj1("report", path, read_trj1_xlsx)
+    actual = parse_trj1("report", io.StringIO(to_text(path, sep)), partial(read_csv_chunked, sep=sep, chunksize=500))
+    for name in ARRAYS:
+        np.testing.assert_array_equal(getattr(actual, name), getattr(expected, name), err_msg=name)
+    assert actual.title_names.equals(expected.title_names)
+    assert actual.metric_types == expected.metric_types
+    assert (actual.start_date, actual.end_date) == (expected.start_date, expected.end_date)
+    assert (actual.platforms, actual.publishers) == (expected.platforms, expected.publishers)
+    assert actual.report_header == expected.report_header
+
+
+# Returns a one-title csv report whose Reporting_Period_Total and single month are count
+def one_title_report(count: int) -> io.StringIO:
+    header = "\n" * 13
+    table = ("Title,Platform,Metric_Type,Reporting_Period_Total,Jul-2019\n"
+             f"Journal,Link,Unique_Item_Requests,{count},{count}\n")
+    return io.StringIO(header + table)
+
+
+def test_counts_beyond_float32_are_exact() -> None:
+    count = 2 ** 24 + 1  # the first integer a float32 can't hold
+    df = read_csv_chunked(one_title_report(count))
+    assert df["Reporting_Period_Total"].dtype == np.int32
+    assert df["Reporting_Period_Total"].tolist() == [count]
+
+
+def test_counts_beyond_int32_raise() -> None:
+    with pytest.raises(ValueError, match="Reporting_Period_Total"):
+        read_csv_chunked(one_title_report(2 ** 31))
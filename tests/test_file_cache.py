@@ -0,0 +1,36 @@
+# Checks that a report loaded from the on-disk cache matches the report parsed from its file
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import file_cache
+from helper_fxns import load_trj1, read_trj1_xlsx
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "data")
+
+ARRAYS = ("title_ids", "months", "usage", "totals", "present", "period_totals", "monthly_totals")
+
+
+@pytest.mark.parametrize("file_name", sorted(os.listdir(DATA_DIR)))
+def test_cache_hit_matches_parse(file_name: str, tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(file_cache, "DISK_CACHE_DIR", str(tmp_path))
+    with open(os.path.join(DATA_DIR, file_name), "rb") as file:
+        content = file.read()
+    parsed = load_trj1(file_name, content, read_trj1_xlsx)
+    assert len(os.listdir(tmp_path)) == 1
+    cached = load_trj1(file_name, content, read_trj1_xlsx)
+
+    for name in ARRAYS:
+        assert getattr(cached, name).dtype == getattr(parsed, name).dtype, name
+        np.testing.assert_array_equal(getattr(cached, name), getattr(parsed, name), err_msg=name)
+    # the arrays are views of the memory-mapped file rather than copies
+    assert not cached.usage.flags.owndata and not cached.usage.flags.writeable
+    assert cached.title_names.equals(parsed.title_names)
+    assert cached.metric_types == parsed.metric_types
+    pd.testing.assert_frame_equal(cached.title_details.fillna(np.nan), parsed.title_details.fillna(np.nan))
+    assert (cached.start_date, cached.end_date) == (parsed.start_date, parsed.end_date)
+    assert (cached.report_header, cached.platforms, cached.publishers) == \
+        (parsed.report_header, parsed.platforms, parsed.publishers)
+    assert cached.header_issues == parsed.header_issues
+    pd.testing.assert_frame_equal(cached.dataframe.fillna(np.nan), parsed.dataframe.fillna(np.nan))
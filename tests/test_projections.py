@@ -0,0 +1,62 @@
+# Checks the batched projections against the per-file loop they replaced
+
+import glob
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from helper_fxns import parse_trj1, update_metric_choice
+from projections import diff_month, project_total_uses_batch, set_complete_incomplete_files
+from trj1 import TRJ1
+from xlsx_reader import read_trj1_xlsx
+
+DATA_PATHS = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                           "data", "*.xlsx")))
+
+
+# The projection as it was computed before project_total_uses_batch: for each complete year, the usage of
+# its first months, as many as the incomplete file has, over its total, averaged over the years
+def project_total_uses_loop(complete_trj1_list, incomplete_trj1) -> int:
+    fraction = 0.0
+    months_completed = diff_month(incomplete_trj1)
+    for trj1 in complete_trj1_list:
+        usage = 0
+        month_count = 0
+        for column_name, column_data in trj1.metric_dataframe.items():
+            if isinstance(column_name, datetime) and month_count < months_completed:
+                usage += column_data.values.sum()
+                month_count += 1
+        fraction += usage / trj1.rpt
+    return round(incomplete_trj1.rpt / (fraction / len(complete_trj1_list)))
+
+
+# Returns a TRJ1 of a few titles with usage in every month from start
+def synthetic_trj1(name: str, start: datetime, months: int, seed: int) -> TRJ1:
+    rng = np.random.default_rng(seed)
+    month_headers = list(pd.date_range(start, periods=months, freq="MS").to_pydatetime())
+    usage = rng.integers(0, 50, size=(5, months))
+    df = pd.DataFrame({"Title": [f"Journal {i}" for i in range(5)], "Metric_Type": "Unique_Item_Requests",
+                       "Reporting_Period_Total": usage.sum(axis=1)}).join(pd.DataFrame(usage, columns=month_headers))
+    trj1 = TRJ1(name, df)
+    trj1.clean_dataframe()
+    trj1.select_metric("Unique_Item_Requests")
+    return trj1
+
+
+@pytest.mark.parametrize("metric_choice", ["Total Item Requests", "Unique Item Requests"])
+def test_batch_matches_loop_on_data(metric_choice: str) -> None:
+    trj1_list = update_metric_choice([parse_trj1(path, path, read_trj1_xlsx) for path in DATA_PATHS], metric_choice)
+    complete_trj1_list, incomplete_trj1 = set_complete_incomplete_files(trj1_list)
+    assert complete_trj1_list and incomplete_trj1
+    assert project_total_uses_batch(complete_trj1_list, incomplete_trj1) == \
+        [project_total_uses_loop(complete_trj1_list, trj1) for trj1 in incomplete_trj1]
+
+
+def test_batch_matches_loop_past_a_complete_year() -> None:
+    complete_trj1_list = [synthetic_trj1(f"FY{2020 + i}", datetime(2019 + i, 7, 1), 12, seed=i) for i in range(2)]
+    incomplete_trj1 = [synthetic_trj1("short", datetime(2021, 7, 1), 5, seed=2),
+                       synthetic_trj1("long", datetime(2021, 7, 1), 14, seed=3)]
+    assert diff_month(incomplete_trj1[1]) > 12
+    assert project_total_uses_batch(complete_trj1_list, incomplete_trj1) == \
+        [project_total_uses_loop(complete_trj1_list, trj1) for trj1 in incomplete_trj1]
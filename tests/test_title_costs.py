@@ -0,0 +1,101 @@
+# Checks the allocation of package costs to titles, the partial-sort rankings and the matching of title prices
+
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from title_costs import TitleCostMatrix, rank_titles, title_cost_per_use, title_ranking
+from trj1 import TRJ1
+
+METRIC_TYPE = "Unique_Item_Requests"
+
+TITLES = pd.DataFrame({
+    "Title": ["Alpha", "Beta", "Gamma", "Delta"],
+    "Print_ISSN": ["1111-1111", "2222-2222", "3333-333X", None],
+    "DOI": ["10.1/alpha", "10.1/beta", None, "10.1/delta"],
+})
+
+
+# Returns a TRJ1 of the titles at positions rows of TITLES, whose usage in each of two months is usage
+def make_trj1(name: str, start: datetime, rows, usage) -> TRJ1:
+    usage = np.asarray(usage)
+    df = TITLES.iloc[rows].reset_index(drop=True).assign(Metric_Type=METRIC_TYPE,
+                                                         Reporting_Period_Total=usage.sum(axis=1))
+    months = list(pd.date_range(start, periods=usage.shape[1], freq="MS").to_pydatetime())
+    trj1 = TRJ1(name, df.join(pd.DataFrame(usage, columns=months)))
+    trj1.clean_dataframe()
+    return trj1
+
+
+@pytest.fixture
+def matrix() -> TitleCostMatrix:
+    # Gamma has no use in the first year and Delta is only in the second
+    first = make_trj1("FY20", datetime(2019, 7, 1), [0, 1, 2], [[10, 20], [3, 2], [0, 0]])
+    second = make_trj1("FY21", datetime(2020, 7, 1), [0, 1, 3], [[5, 5], [1, 0], [4, 4]])
+    return TitleCostMatrix([first, second], METRIC_TYPE)
+
+
+def test_matrix(matrix: TitleCostMatrix) -> None:
+    assert list(matrix.titles) == ["Alpha", "Beta", "Gamma", "Delta"]
+    assert matrix.usage.tolist() == [[30, 10], [5, 1], [0, 0], [0, 8]]
+    assert matrix.present.tolist() == [[True, True], [True, True], [True, False], [False, True]]
+
+
+@pytest.mark.parametrize("method", ["usage", "list_price"])
+def test_costs_sum_to_package_cost(matrix: TitleCostMatrix, method: str) -> None:
+    costs = [1000.0, 600.0]
+    prices = np.array([100.0, 50.0, 25.0, np.nan])
+    _, cost = matrix.allocate(costs, method, prices)
+    np.testing.assert_allclose(np.nansum(cost, axis=0), costs)
+
+
+def test_price_file_costs_each_title_its_price(matrix: TitleCostMatrix) -> None:
+    prices = np.array([100.0, 50.0, 25.0, 10.0])
+    _, cost = matrix.allocate([1000.0, 600.0], "price_file", prices)
+    np.testing.assert_allclose(np.nansum(cost, axis=0), [175.0, 160.0])
+    assert np.isnan(cost[3, 0]) and np.isnan(cost[2, 1])
+
+
+def test_zero_use_with_a_price_has_infinite_cost_per_use(matrix: TitleCostMatrix) -> None:
+    prices = np.array([100.0, 50.0, 25.0, 10.0])
+    usage, cost = matrix.allocate([1000.0, 600.0], "list_price", prices)
+    _, title_cost, cost_per_use = title_cost_per_use(usage, cost, file=0)
+    assert title_cost[2] > 0
+    assert np.isposinf(cost_per_use[2])
+    ranking = title_ranking(matrix, usage, cost, 1, largest=True, file=0)
+    assert ranking["Title"].tolist() == ["Gamma"]
+
+
+@pytest.mark.parametrize("largest", [True, False])
+@pytest.mark.parametrize("k", [1, 5, 50, 200])
+def test_rank_titles_matches_a_full_sort(k: int, largest: bool) -> None:
+    rng = np.random.default_rng(k)
+    values = rng.random(100)
+    values[rng.choice(100, 10, replace=False)] = np.nan
+    values[rng.choice(np.flatnonzero(~np.isnan(values)), 3, replace=False)] = np.inf
+    candidates = np.flatnonzero(~np.isnan(values))
+    order = candidates[np.argsort(-values[candidates] if largest else values[candidates], kind="stable")]
+    np.testing.assert_array_equal(rank_titles(values, k, largest), order[:k])
+
+
+def test_prices_are_matched_on_identifiers_before_titles(matrix: TitleCostMatrix) -> None:
+    prices = pd.DataFrame({
+        # the title says Alpha but the ISSN is Beta's, written differently
+        "Title": ["Alpha", "Gamma", "Delta", "Unknown"],
+        "Print_ISSN": ["2222 2222", "3333-333x", None, "9999-9999"],
+        "DOI": [None, None, "10.1/DELTA", None],
+        "Price": ["50", "25", "10", "99"],
+    })
+    np.testing.assert_array_equal(matrix.match_prices(prices), [np.nan, 50.0, 25.0, 10.0])
+
+
+def test_prices_fall_back_on_titles(matrix: TitleCostMatrix) -> None:
+    prices = pd.DataFrame({"Title": ["Alpha", "Delta"], "Price": ["100", "not a price"]})
+    np.testing.assert_array_equal(matrix.match_prices(prices), [100.0, np.nan, np.nan, np.nan])
+
+
+@pytest.mark.parametrize("k", [1, 7, 30])
+def test_rank_titles_ranks_ties_by_position(k: int) -> None:
+    values = np.random.default_rng(k).integers(0, 5, size=60).astype(np.float64)
+    order = np.argsort(-values, kind="stable")
+    np.testing.assert_array_equal(rank_titles(values, k), order[:k])
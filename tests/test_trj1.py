@@ -0,0 +1,27 @@
+# Checks how TRJ1 builds its usage arrays from a report dataframe
+
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from trj1 import TRJ1
+
+
+# Returns a one-title report dataframe, as pd.read_excel reads it, with count as every usage value
+def one_title_dataframe(count) -> pd.DataFrame:
+    return pd.DataFrame({"Title": ["Journal"], "Metric_Type": ["Unique_Item_Requests"],
+                         "Reporting_Period_Total": [count], datetime(2019, 7, 1): [count]})
+
+
+def test_counts_beyond_int32_raise() -> None:
+    trj1 = TRJ1("report.xlsx", one_title_dataframe(2 ** 31 + 5))
+    with pytest.raises(ValueError):
+        trj1.clean_dataframe()
+
+
+def test_blank_counts_are_one() -> None:
+    trj1 = TRJ1("report.xlsx", one_title_dataframe(np.nan))
+    trj1.clean_dataframe()
+    assert trj1.totals.dtype == np.int32
+    assert trj1.totals.tolist() == [[1]]
+    assert trj1.usage.tolist() == [[[1]]]
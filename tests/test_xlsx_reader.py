@@ -0,0 +1,95 @@
+# Checks the streaming xlsx reader against pd.read_excel, which it replaced, on the bundled reports
+
+import glob
+import os
+import xml.etree.ElementTree as ET
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from trj1 import METRIC_TYPES, UNUSED_COLUMNS
+from xlsx_reader import HEADER_ATTR, _string_text, read_trj1_xlsx
+
+DATA_PATHS = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                           "data", "*.xlsx")))
+
+
+# Returns the report as pd.read_excel reads it, narrowed the way read_trj1_xlsx documents: unused columns and
+# rows of other metric types left out, blank counts as 1 and counts as int32
+def read_expected(path: str) -> pd.DataFrame:
+    df = pd.read_excel(path, skiprows=13, index_col=False)
+    df = df.drop(columns=[column for column in UNUSED_COLUMNS if column in df.columns])
+    df = df[df["Metric_Type"].isin(METRIC_TYPES)].reset_index(drop=True)
+    counts = list(df.columns[df.columns.get_loc("Reporting_Period_Total"):])
+    df[counts] = df[counts].fillna(1).astype(np.int32)
+    return df
+
+
+@pytest.mark.parametrize("path", DATA_PATHS, ids=os.path.basename)
+def test_values_match_read_excel(path: str) -> None:
+    expected = read_expected(path)
+    actual = read_trj1_xlsx(path)
+    assert list(actual.columns) == list(expected.columns)
+    labels = [column for column in expected.columns if not pd.api.types.is_integer_dtype(expected[column])]
+    for column in labels:
+        assert actual[column].astype(object).where(actual[column].notna(), None).tolist() == \
+            expected[column].astype(object).where(expected[column].notna(), None).tolist(), column
+    counts = [column for column in expected.columns if column not in labels]
+    np.testing.assert_array_equal(actual[counts].to_numpy(), expected[counts].to_numpy())
+    assert all(actual[column].dtype == np.int32 for column in counts)
+
+
+@pytest.mark.parametrize("path", DATA_PATHS, ids=os.path.basename)
+def test_month_headers_match_read_excel(path: str) -> None:
+    expected = [column for column in pd.read_excel(path, skiprows=13, nrows=0).columns
+                if isinstance(column, datetime)]
+    actual = [column for column in read_trj1_xlsx(path).columns if isinstance(column, datetime)]
+    assert expected
+    assert actual == expected
+
+
+@pytest.mark.parametrize("path", DATA_PATHS, ids=os.path.basename)
+def test_report_header(path: str) -> None:
+    rows = pd.read_excel(path, header=None, nrows=13, usecols=[0, 1])
+    expected = {str(name).strip(): "" if pd.isna(value) else str(value).strip()
+                for name, value in rows.itertuples(index=False) if pd.notna(name)}
+    header = read_trj1_xlsx(path).attrs[HEADER_ATTR]
+    assert header == expected
+    assert header["Report_ID"] == "TR_J1"
+    assert header["Reporting_Period"].startswith("Begin_Date=")
+
+
+# Writes a one-title report with count as its Reporting_Period_Total and single month to path
+def write_one_title_report(path: str, count: int) -> None:
+    header = pd.DataFrame([["Report_ID", "TR_J1"], ["Reporting_Period", "Begin_Date=2019-07-01; End_Date=2019-07-31"]])
+    table = pd.DataFrame({"Title": ["Journal"], "Platform": ["Link"], "Metric_Type": ["Unique_Item_Requests"],
+                          "Reporting_Period_Total": [count], datetime(2019, 7, 1): [count]})
+    with pd.ExcelWriter(path) as writer:
+        header.to_excel(writer, header=False, index=False)
+        table.to_excel(writer, startrow=13, index=False)
+
+
+def test_counts_beyond_int32_raise(tmp_path) -> None:
+    path = str(tmp_path / "report.xlsx")
+    write_one_title_report(path, 2 ** 31 + 5)
+    with pytest.raises(ValueError, match="Reporting_Period_Total"):
+        read_trj1_xlsx(path)
+
+
+def test_header_is_kept(tmp_path) -> None:
+    path = str(tmp_path / "report.xlsx")
+    write_one_title_report(path, 5)
+    df = read_trj1_xlsx(path)
+    assert df["Reporting_Period_Total"].tolist() == [5]
+    assert df.attrs[HEADER_ATTR]["Report_ID"] == "TR_J1"
+
+
+def test_shared_strings_leave_out_phonetic_guides() -> None:
+    namespace = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    strings = ET.fromstring(
+        f'<sst xmlns="{namespace}">'
+        '<si><t>Plain</t></si>'
+        '<si><r><t>Rich </t></r><r><rPr><b/></rPr><t>text</t></r></si>'
+        '<si><t>漢字</t><rPh sb="0" eb="2"><t>かんじ</t></rPh><phoneticPr fontId="1"/></si>'
+        '</sst>')
+    assert [_string_text(element) for element in strings] == ["Plain", "Rich text", "漢字"]
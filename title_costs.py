@@ -0,0 +1,193 @@
+# This file contains the title-level cost per use engine behind the "Title Cost Per Use" rankings. The package
+# cost of each file is allocated to its titles and the titles with the highest or lowest cost per use are found
+# with partial sorts, so that rankings of large packages are recomputed on every change of the costs.
+
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from file_cache import LRUCache, get_or_build
+from title_index import normalize_identifier
+from trj1 import DETAIL_COLUMNS, TRJ1
+
+# Ways of splitting a file's package cost between its titles
+ALLOCATION_METHODS = {
+    "usage": "Usage share",
+    "list_price": "List price",
+    "price_file": "Price file",
+}
+
+# Values titles can be ranked by
+RANKING_VALUES = ("Cost_Per_Use", "Usage", "Cost")
+
+# Number of title cost matrices kept, one per set of loaded files and metric type
+TITLE_COST_CACHE_SIZE = 8
+
+title_cost_cache = LRUCache(TITLE_COST_CACHE_SIZE)
+
+
+class TitleCostMatrix:
+    """
+    Reporting_Period_Total of every title in every loaded file for one metric type, as a dense titles by files
+    matrix with the rows of a title listed more than once summed, so that costs are allocated to titles and
+    ranked with array operations instead of dataframe filters
+
+    Parameters
+    ----------
+    trj1_list: List[TRJ1]
+            loaded files, in chronological order
+    metric_type: str
+            metric type whose usage is counted
+
+    Attributes
+    ----------
+    titles: pd.Index
+            each title of the loaded files once
+    usage: np.ndarray
+            int64 array of shape (titles, files) with each title's reporting period total in each file
+    present: np.ndarray
+            bool array of shape (titles, files), False where a file doesn't list the title
+    """
+
+    __slots__ = ("titles", "usage", "present", "_keys", "_key_titles")
+
+    def __init__(self, trj1_list: List[TRJ1], metric_type: str) -> None:
+        files = [trj1 for trj1 in trj1_list if metric_type in trj1.metric_types]
+        self.titles = pd.Index(pd.unique(np.concatenate([trj1.title_names.to_numpy(dtype=object)
+                                                         for trj1 in files] or [[]])))
+        self.usage = np.zeros((len(self.titles), len(trj1_list)), dtype=np.int64)
+        self.present = np.zeros((len(self.titles), len(trj1_list)), dtype=bool)
+
+        keys, key_titles = [], []
+        for j, trj1 in enumerate(trj1_list):
+            if metric_type not in trj1.metric_types:
+                continue
+            metric = trj1.metric_types.index(metric_type)
+            rows = np.flatnonzero(trj1.present[metric])
+            title_ids = self.titles.get_indexer(trj1.title_names)[trj1.title_ids[rows]]
+            self.usage[:, j] = np.bincount(title_ids, weights=trj1.totals[metric, rows],
+                                           minlength=len(self.titles)).astype(np.int64)
+            self.present[title_ids, j] = True
+            for column in trj1.title_details.columns:
+                identifiers = trj1.title_details[column].to_numpy()[rows]
+                known = pd.notna(identifiers)
+                keys.extend(normalize_identifier(identifier) for identifier in identifiers[known])
+                key_titles.append(title_ids[known])
+
+        # ISSNs and DOIs of the titles, each identifier pointing to the first title found with it
+        identifier_index = pd.Index(keys, dtype=object)
+        first = ~identifier_index.duplicated()
+        self._keys = identifier_index[first]
+        self._key_titles = np.concatenate(key_titles or [[]]).astype(np.intp)[first]
+
+    # Returns the price of every title from a price table with a Price column and a Title, Print_ISSN,
+    # Online_ISSN or DOI column, NaN for titles without a price. Identifiers are matched before titles.
+    def match_prices(self, prices: pd.DataFrame) -> np.ndarray:
+        matched = np.full(len(prices), -1, dtype=np.intp)
+        for column in DETAIL_COLUMNS:
+            if column in prices.columns and len(self._keys):
+                keys = [normalize_identifier(key) if pd.notna(key) else "" for key in prices[column]]
+                positions = self._keys.get_indexer(keys)
+                ids = np.where(positions >= 0, self._key_titles[positions], -1)
+                matched = np.where(matched < 0, ids, matched)
+        if "Title" in prices.columns:
+            matched = np.where(matched < 0, self.titles.get_indexer(prices["Title"].astype(object)), matched)
+
+        values = pd.to_numeric(prices["Price"], errors="coerce").to_numpy(dtype=np.float64)
+        known = (matched >= 0) & ~np.isnan(values)
+        title_prices = np.full(len(self.titles), np.nan)
+        title_prices[matched[known]] = values[known]
+        return title_prices
+
+    # Returns the usage and allocated cost of every title in every file, as float arrays of shape (titles, files)
+    # that are NaN where a file doesn't list the title or no cost is allocated to it. costs holds the package
+    # cost of each file, 0 or NaN when unknown, and method is a key of ALLOCATION_METHODS:
+    # - usage: the package cost is split in proportion to each title's usage
+    # - list_price: the package cost is split in proportion to each title's price, titles without one get none
+    # - price_file: each title costs its price every year, whatever the package cost
+    # usage_scale multiplies the usage of each file, such as an incomplete year's projected usage over its usage.
+    def allocate(self, costs: Sequence[float], method: str, prices: Optional[np.ndarray] = None,
+                 usage_scale: Optional[Sequence[float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        scale = np.ones(self.usage.shape[1]) if usage_scale is None else np.asarray(usage_scale, dtype=np.float64)
+        usage = np.where(self.present, self.usage * scale, np.nan)
+        costs = np.asarray(costs, dtype=np.float64)
+        costs = np.where(costs > 0, costs, np.nan)
+
+        if method == "price_file":
+            cost = np.where(self.present, prices[:, np.newaxis], np.nan)
+        else:
+            if method == "usage":
+                weights = np.where(self.present, usage, 0)
+            elif method == "list_price":
+                weights = np.where(self.present, np.nan_to_num(prices)[:, np.newaxis], 0)
+            else:
+                raise ValueError(f"unknown allocation method {method}")
+            with np.errstate(invalid="ignore", divide="ignore"):
+                cost = costs * weights / weights.sum(axis=0)
+            # titles with no weight, such as titles without a list price, get no cost rather than a cost of 0
+            cost[weights == 0] = np.nan
+        return (usage, cost)
+
+
+# Returns the usage, cost and cost per use of every title for one file, or summed over every file with a cost
+# when file is None. Each is a float array with NaN for titles without a cost in those files.
+def title_cost_per_use(usage: np.ndarray, cost: np.ndarray,
+                       file: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    if file is not None:
+        usage, cost = usage[:, file], cost[:, file]
+    else:
+        has_cost = ~np.isnan(cost)
+        costed = has_cost.any(axis=1)
+        usage = np.where(costed, np.where(has_cost, usage, 0).sum(axis=1), np.nan)
+        cost = np.where(costed, np.nansum(cost, axis=1), np.nan)
+    # titles with a cost and no use have an infinite cost per use, which ranks them first
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cost_per_use = np.where(np.isnan(cost), np.nan, cost / usage)
+    return (usage, cost, cost_per_use)
+
+
+# Returns the positions of the k largest, or smallest, values ignoring NaN, ordered from the first ranked.
+# Only the k selected values are sorted, after a partial sort with argpartition. Equal values, such as the
+# infinite cost per use of unused titles, are ranked by position, as a full stable sort would.
+def rank_titles(values: np.ndarray, k: int, largest: bool = True) -> np.ndarray:
+    candidates = np.flatnonzero(~np.isnan(values))
+    k = min(k, len(candidates))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    keyed = -values[candidates] if largest else values[candidates]
+    if k < len(candidates):
+        # argpartition picks any of the values equal to the last one kept, so those are taken in order
+        last = keyed[np.argpartition(keyed, k - 1)[k - 1]]
+        below = np.flatnonzero(keyed < last)
+        selected = np.sort(np.concatenate([below, np.flatnonzero(keyed == last)[:k - len(below)]]))
+    else:
+        selected = np.arange(len(candidates))
+    return candidates[selected[np.argsort(keyed[selected], kind="stable")]]
+
+
+# Returns the top or bottom k titles by one of RANKING_VALUES as a dataframe, for one file or every file
+def title_ranking(matrix: TitleCostMatrix, usage: np.ndarray, cost: np.ndarray, k: int, largest: bool = True,
+                  file: Optional[int] = None, by: str = "Cost_Per_Use") -> pd.DataFrame:
+    usage, cost, cost_per_use = title_cost_per_use(usage, cost, file)
+    values = {"Cost_Per_Use": cost_per_use, "Usage": np.where(np.isnan(cost), np.nan, usage), "Cost": cost}[by]
+    positions = rank_titles(values, k, largest)
+    return pd.DataFrame({
+        "Title": matrix.titles.take(positions),
+        "Usage": usage[positions],
+        "Cost": cost[positions],
+        "Cost_Per_Use": cost_per_use[positions],
+    }, index=pd.RangeIndex(1, len(positions) + 1, name="Rank"))
+
+
+# Reads a csv of title prices with a Price column and a Title, Print_ISSN, Online_ISSN or DOI column to match titles
+def read_title_prices(source) -> pd.DataFrame:
+    prices = pd.read_csv(source, dtype=str)
+    identifiers = [column for column in ("Title", *DETAIL_COLUMNS) if column in prices.columns]
+    if "Price" not in prices.columns or not identifiers:
+        raise ValueError(f"{getattr(source, 'name', source)} needs a Price column and a Title, Print_ISSN, "
+                         "Online_ISSN or DOI column")
+    return prices
+
+
+# Returns the title cost matrix of the loaded files for metric_type, built once per set of files
+def get_title_cost_matrix(trj1_list: List[TRJ1], metric_type: str) -> TitleCostMatrix:
+    return get_or_build(title_cost_cache, trj1_list, metric_type, lambda: TitleCostMatrix(trj1_list, metric_type))
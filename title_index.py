@@ -0,0 +1,165 @@
+# This file contains the cross-year title index behind the "Reporting Period Total over Time" bar chart
+# and the search index behind its title multiselect
+
+import re
+from typing import List
+import numpy as np
+import pandas as pd
+from file_cache import LRUCache, get_or_build
+from trj1 import TRJ1
+
+# Number of title indexes kept, one per set of loaded files
+TITLE_INDEX_CACHE_SIZE = 8
+
+# Maximum number of titles offered by the multiselect for one search
+SEARCH_RESULT_LIMIT = 2000
+
+title_index_cache = LRUCache(TITLE_INDEX_CACHE_SIZE)
+title_search_cache = LRUCache(TITLE_INDEX_CACHE_SIZE)
+
+
+class TitleIndex:
+    """
+    Long-format table with the Reporting_Period_Total of every title in every loaded file and metric type,
+    with a hash index from title to its rows so that selected titles are looked up without a concat
+
+    Parameters
+    ----------
+    trj1_list: List[TRJ1]
+            loaded files, in the order of fiscal_years
+    fiscal_years: List[str]
+            label of each file shown in the bar chart legend
+    """
+
+    __slots__ = ("titles", "fiscal_years", "metric_types", "title_id", "fiscal_year", "metric",
+                 "total", "_order", "_offsets")
+
+    def __init__(self, trj1_list: List[TRJ1], fiscal_years: List[str]) -> None:
+        self.fiscal_years = list(fiscal_years)
+        self.metric_types = sorted({metric for trj1 in trj1_list for metric in trj1.metric_types})
+        self.titles = pd.Index(pd.unique(np.concatenate([trj1.title_names.to_numpy(dtype=object)
+                                                         for trj1 in trj1_list] or [[]])))
+
+        title_id, fiscal_year, metric, total = [], [], [], []
+        for year, trj1 in enumerate(trj1_list):
+            # position of each of the file's titles in the index
+            file_title_ids = self.titles.get_indexer(trj1.title_names)
+            # rows are listed title by title, with each title's metric types together like in the report
+            rows, metrics = np.nonzero(trj1.present.T)
+            title_id.append(file_title_ids[trj1.title_ids[rows]])
+            fiscal_year.append(np.full(len(rows), year))
+            metric.append(np.searchsorted(self.metric_types, np.asarray(trj1.metric_types, dtype=object)[metrics]))
+            total.append(trj1.totals[metrics, rows])
+
+        self.title_id = np.concatenate(title_id or [[]]).astype(np.int32)
+        self.fiscal_year = np.concatenate(fiscal_year or [[]]).astype(np.int16)
+        self.metric = np.concatenate(metric or [[]]).astype(np.int8)
+        self.total = np.concatenate(total or [[]]).astype(np.int32)
+
+        # rows grouped by title, the rows of title i are _order[_offsets[i]:_offsets[i + 1]]
+        self._order = np.argsort(self.title_id, kind="stable")
+        self._offsets = np.searchsorted(self.title_id[self._order], np.arange(len(self.titles) + 1))
+
+    # Returns the Title, Fiscal_Year and Reporting_Period_Total of the selected titles for one metric type,
+    # in the same order as the files and the titles within each file
+    def lookup(self, titles: List[str], metric_type: str) -> pd.DataFrame:
+        ids = self.titles.get_indexer(titles)
+        rows = [self._order[self._offsets[i]:self._offsets[i + 1]] for i in ids[ids >= 0]]
+        rows = np.sort(np.concatenate(rows)) if rows else np.empty(0, dtype=np.intp)
+        if metric_type in self.metric_types:
+            rows = rows[self.metric[rows] == self.metric_types.index(metric_type)]
+        else:
+            rows = rows[:0]
+
+        return pd.DataFrame({
+            "Title": self.titles.take(self.title_id[rows]),
+            "Fiscal_Year": pd.Categorical(np.asarray(self.fiscal_years, dtype=object)[self.fiscal_year[rows]]),
+            "Reporting_Period_Total": self.total[rows],
+        })
+
+
+# Returns the title index of the loaded files, built once per set of files and labels
+def get_title_index(trj1_list: List[TRJ1], fiscal_years: List[str]) -> TitleIndex:
+    return get_or_build(title_index_cache, trj1_list, tuple(fiscal_years),
+                        lambda: TitleIndex(trj1_list, fiscal_years))
+
+
+class TitleSearch:
+    """
+    Sorted titles of the loaded files with a prefix index on the lowercased titles and on their
+    ISSNs and DOIs, so that each keystroke in the search box only looks at the matching titles
+
+    Parameters
+    ----------
+    trj1_list: List[TRJ1]
+            loaded files
+    metric_type: str
+            metric type the titles must have a row for
+    """
+
+    __slots__ = ("titles", "_lower", "_lower_order", "_keys", "_key_titles")
+
+    def __init__(self, trj1_list: List[TRJ1], metric_type: str) -> None:
+        titles, keys, key_titles = set(), [], []
+        for trj1 in trj1_list:
+            if metric_type not in trj1.metric_types:
+                continue
+            rows = np.flatnonzero(trj1.present[trj1.metric_types.index(metric_type)])
+            row_titles = trj1.title_names.take(trj1.title_ids[rows])
+            titles.update(row_titles)
+            for column in trj1.title_details.columns:
+                identifiers = trj1.title_details[column].to_numpy()[rows]
+                known = pd.notna(identifiers)
+                keys.extend(normalize_identifier(identifier) for identifier in identifiers[known])
+                key_titles.extend(row_titles[known])
+
+        # sorted exactly as the multiselect always listed its titles
+        self.titles = np.array(sorted(titles), dtype=object)
+        lower = np.array([title.lower() for title in self.titles], dtype=object)
+        self._lower_order = np.argsort(lower, kind="stable")
+        self._lower = lower[self._lower_order]
+
+        order = np.argsort(np.array(keys, dtype=object), kind="stable")
+        self._keys = np.array(keys, dtype=object)[order]
+        self._key_titles = np.array(key_titles, dtype=object)[order]
+
+    def __contains__(self, title: str) -> bool:
+        position = np.searchsorted(self.titles, title)
+        return position < len(self.titles) and self.titles[position] == title
+
+    # Returns up to limit titles for query: titles with an ISSN or DOI starting with the query, then titles
+    # starting with the query and then titles containing it. An empty query returns the first titles in sorted order.
+    def search(self, query: str, limit: int = SEARCH_RESULT_LIMIT) -> List[str]:
+        query = query.strip()
+        if not query:
+            return self.titles[:limit].tolist()
+
+        # ISSNs and DOIs always contain digits, which keeps plain title searches off the identifiers
+        key = normalize_identifier(query)
+        identifier_matches = self._key_titles[_prefix_range(self._keys, key)] if re.search(r"\d", key) else []
+        text = query.lower()
+        prefix = self._lower_order[_prefix_range(self._lower, text)]
+
+        results = dict.fromkeys(identifier_matches)
+        results.update(dict.fromkeys(self.titles[np.sort(prefix)]))
+        if len(results) < limit:
+            contains = pd.Series(self._lower, copy=False).str.contains(text, regex=False).to_numpy()
+            results.update(dict.fromkeys(self.titles[np.sort(self._lower_order[contains])]))
+        return list(results)[:limit]
+
+
+# Identifiers are compared without case, hyphens or spaces, so 1234-567X matches 1234567x
+def normalize_identifier(identifier) -> str:
+    return re.sub(r"[\s-]", "", str(identifier)).lower()
+
+
+# Slice of the sorted array of strings that start with prefix
+def _prefix_range(values: np.ndarray, prefix: str) -> slice:
+    start = np.searchsorted(values, prefix, side="left")
+    end = np.searchsorted(values, prefix + "\U0010ffff", side="left")
+    return slice(int(start), int(end))
+
+
+# Returns the search index of the loaded files for metric_type, built once per set of files
+def get_title_search(trj1_list: List[TRJ1], metric_type: str) -> TitleSearch:
+    return get_or_build(title_search_cache, trj1_list, metric_type, lambda: TitleSearch(trj1_list, metric_type))
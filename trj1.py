@@ -1,12 +1,69 @@
 import pandas as pd
 from datetime import datetime
+import re
 import numpy as np
+import pyarrow as pa
 import streamlit as st
-from typing import List
+from typing import List, Optional, Tuple
+
+# Columns of a TR_J1 report that are not used by the app and are removed when cleaning
+UNUSED_COLUMNS = ["Publisher_ID", "Proprietary_ID", "URI"]
+
+# Columns naming the package a report belongs to, read once when usage is built and then dropped
+PACKAGE_COLUMNS = ["Platform", "Publisher"]
+
+# Identifier columns kept once per row in title_details, so titles can be searched by ISSN or DOI
+DETAIL_COLUMNS = ["DOI", "Print_ISSN", "Online_ISSN"]
+
+# Metric types reported in a TR_J1 report
+METRIC_TYPES = ("Total_Item_Requests", "Unique_Item_Requests")
+
+# Month of date as the number of months since January 1970, the same count as a datetime64[M] value
+def month_ordinal(date: datetime) -> int:
+    return (date.year - 1970) * 12 + date.month - 1
+
+# First day of the month with the given month_ordinal, as a datetime
+def month_from_ordinal(ordinal: int) -> datetime:
+    return datetime(1970 + ordinal // 12, ordinal % 12 + 1, 1)
+
+_BEGIN_DATE = re.compile(r"Begin_Date\s*=\s*(\d{4})-(\d{1,2})", re.IGNORECASE)
+_END_DATE = re.compile(r"End_Date\s*=\s*(\d{4})-(\d{1,2})", re.IGNORECASE)
+
+# Returns the first and last month of a header's Reporting_Period, such as
+# "Begin_Date=2019-07-01; End_Date=2020-06-30", as datetimes, or None when either date is missing
+def parse_reporting_period(value: str) -> Optional[Tuple[datetime, datetime]]:
+    begin, end = _BEGIN_DATE.search(value), _END_DATE.search(value)
+    if not begin or not end or not 1 <= int(begin[2]) <= 12 or not 1 <= int(end[2]) <= 12:
+        return None
+    return (datetime(int(begin[1]), int(begin[2]), 1), datetime(int(end[1]), int(end[2]), 1))
+
+# Returns usage counts as an int32 array, with blank counts as 1 like TRJ1.clean_dataframe. Counts read as
+# floats are handled as float64, exact for every int32, and counts that don't fit in an int32 raise a ValueError
+# naming column. Counts that are already int32 are returned as they are.
+def to_usage_counts(values, column: str = "usage") -> np.ndarray:
+    values = np.asarray(values)
+    if values.dtype == np.int32:
+        return values
+    counts = np.nan_to_num(values.astype(np.float64), nan=1)
+    limits = np.iinfo(np.int32)
+    if counts.size and (counts.min() < limits.min or counts.max() > limits.max):
+        raise ValueError(f"the {column} column has counts that don't fit in a 32-bit integer")
+    return counts.astype(np.int32)
+
+# Returns the distinct non-blank values of a column as text, the most frequent first
+def _distinct_values(values: pd.Series) -> Tuple[str, ...]:
+    values = values.dropna().astype(str).str.strip()
+    return tuple(str(value) for value in values[values != ""].value_counts(sort=True).index)
+
+# Returns the chunks of a column as one array, without copying it when it has a single chunk
+def _single_chunk(column: pa.ChunkedArray) -> pa.Array:
+    return column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+
 
 class TRJ1:
     """
-    Represents a traditional TRJ1 file that includes the file and relevant data
+    Represents a traditional TRJ1 file that includes the file and relevant data.
+    Once cleaned, the usage is held in NumPy arrays instead of the dataframe that was read.
     
     Parameters
     ----------
@@ -26,8 +83,57 @@ class TRJ1:
             projected usage calculated in helper_fxns.py and stored in var if current TRJ1 is not complete FY
     projected_cpu: float, default None
             projected cost per use given projected usage and cost, only used for incomplete FY TRj1's
+    metric_type: str, default None
+            metric type selected with select_metric(), used for rpt and metric_dataframe
+    source_hash: str, default None
+            SHA-256 of the file the report was read from, identifies the report in caches
+    report_header: dict, default None
+            COUNTER header block above the table, such as Report_Name, Reporting_Period and Created,
+            mapping each name to its value as text. Empty when the report was read without it.
+    platforms: tuple, default None
+            distinct Platform values of the report's titles, the most frequent first. Empty when the report
+            has no Platform column.
+    publishers: tuple, default None
+            distinct Publisher values of the report's titles, the most frequent first
+
+    Attributes set by build_usage()
+    -------------------------------
+    metric_types: tuple
+            metric types found in the report, in sorted order
+    reporting_period: tuple
+            first and last month of the header's Reporting_Period as datetimes, None without one
+    institution_id: str
+            Institution_ID of the header, empty without one
+    header_issues: List[str]
+            ways in which the header disagrees with the usage columns, such as a Reporting_Period
+            that doesn't match the months with usage
+    title_names: pd.Index
+            each distinct title once, so title strings are stored only once
+    title_ids: np.ndarray
+            int32 position in title_names of each row. A title listed more than once has several rows
+    title_details: pd.DataFrame
+            DETAIL_COLUMNS found in the report, one row per row of usage
+    months: np.ndarray
+            datetime64[M] month of each usage column
+    usage: np.ndarray
+            contiguous int32 array of shape (metric types, rows, months) with the monthly usage
+    totals: np.ndarray
+            int32 array of shape (metric types, rows) with the Reporting_Period_Total column
+    present: np.ndarray
+            bool array of shape (metric types, rows), False where a title has no row for a metric type
+    period_totals: np.ndarray
+            sum of totals for each metric type
+    monthly_totals: np.ndarray
+            int64 array of shape (metric types, months) with the usage of all titles in each month
+    derived: dict
+            structures computed from the arrays, such as usage distributions, shared by every copy
     """
 
+    __slots__ = ("name", "source_hash", "start_date", "end_date", "rpt", "cpu", "projected_usage", "projected_cpu",
+                 "metric_type", "report_header", "platforms", "publishers", "metric_types", "reporting_period",
+                 "institution_id", "header_issues", "title_names", "title_ids", "title_details", "months", "usage",
+                 "totals", "present", "period_totals", "monthly_totals", "derived", "_raw_dataframe")
+
     def __init__(
         self,
         name: str, 
@@ -37,47 +143,187 @@ class TRJ1:
         rpt: float = None, # reporting period total sum
         cpu: float = None,  # cost per use
         projected_usage: int = None, # projected usage to set cost per use
-        projected_cpu: float = None # projected cost per use, set for not full fiscal years
+        projected_cpu: float = None, # projected cost per use, set for not full fiscal years
+        metric_type: str = None,
+        source_hash: str = None,
+        report_header: dict = None,
+        platforms: tuple = None,
+        publishers: tuple = None
     ) -> None:
         
         self.name = name
-        self.dataframe = dataframe
+        self.source_hash = source_hash
         self.start_date = start_date
         self.end_date = end_date
         self.rpt = rpt # sum of unique or total item req
         self.cpu = cpu # cost per use
         self.projected_usage = projected_usage # projected usage to set cost per use
         self.projected_cpu = projected_cpu # projected cost per use, only set if not full fiscal year
+        self.metric_type = metric_type
+        self.report_header = report_header if report_header is not None else {}
+        self.platforms = tuple(platforms or ())
+        self.publishers = tuple(publishers or ())
+        self.metric_types = ()
+        self.reporting_period = None
+        self.institution_id = ""
+        self.header_issues = []
+        self.title_names = pd.Index([], dtype=object)
+        self.title_ids = np.empty(0, dtype=np.int32)
+        self.title_details = pd.DataFrame()
+        self.months = np.empty(0, dtype="datetime64[M]")
+        self.usage = np.empty((0, 0, 0), dtype=np.int32)
+        self.totals = np.empty((0, 0), dtype=np.int32)
+        self.present = np.empty((0, 0), dtype=bool)
+        self.period_totals = np.empty(0, dtype=np.int64)
+        self.monthly_totals = np.empty((0, 0), dtype=np.int64)
+        self.derived = {}
+        self._raw_dataframe = dataframe # dataframe as read, released by build_usage()
 
     def __str__(self) -> str:
-        list_data = ""
-        for data in self.dataframe.columns.values:
-            if type(data) == datetime:
-                list_data += " " + data.strftime("%m/%Y")
-            else:
-                try:
-                    new_datetime = pd.to_datetime(data)
-                    list_data += " " + new_datetime.strftime("%m/%Y")
-                except ValueError:
-                    list_data += " " + data
-        return self.name + list_data
+        return self.name + "".join(" " + date.strftime("%m/%Y") for date in self.get_header_dates())
+
+    # Report as a dataframe with one row per title and metric type. Until build_usage() is called this is
+    # the dataframe that was read, afterwards it is rebuilt from the arrays each time it is accessed.
+    @property
+    def dataframe(self) -> pd.DataFrame:
+        if self._raw_dataframe is not None:
+            return self._raw_dataframe
+        return self.get_dataframe()
+
+    # Number of rows of dataframe, one per title and metric type
+    def get_row_count(self) -> int:
+        return int(self.present.sum())
+
+    # Returns only the given slice of the rows of dataframe, so that a page of a large report is built on its own
+    def get_dataframe(self, positions: slice = slice(None)) -> pd.DataFrame:
+        # each title's metric types stay next to each other, as in the report
+        rows, metrics = np.nonzero(self.present.T)
+        row_index = pd.RangeIndex(len(rows))[positions]
+        rows, metrics = rows[positions], metrics[positions]
+        df = pd.DataFrame(self.usage[metrics, rows], index=row_index, columns=self._month_columns())
+        df.insert(0, "Reporting_Period_Total", self.totals[metrics, rows])
+        df.insert(0, "Metric_Type", pd.Categorical.from_codes(metrics, self.metric_types))
+        for position, column in enumerate(self.title_details.columns):
+            df.insert(position, column, self.title_details[column].to_numpy()[rows])
+        df.insert(0, "Title", self.title_names.take(self.title_ids[rows]))
+        return df.rename_axis("Row Index")
+
+    # Returns get_dataframe(positions) as an Arrow table, which Streamlit displays without converting it.
+    # Titles and metric types are dictionary encoded against the report's distinct values.
+    def get_arrow_table(self, positions: slice = slice(None)) -> pa.Table:
+        rows, metrics = np.nonzero(self.present.T)
+        row_index = np.arange(len(rows))[positions]
+        rows, metrics = rows[positions], metrics[positions]
+        columns = {"Row Index": row_index, "Title": self._arrow_titles(rows)}
+        for column in self.title_details.columns:
+            columns[column] = pa.array(self.title_details[column].to_numpy()[rows], from_pandas=True)
+        columns["Metric_Type"] = pa.DictionaryArray.from_arrays(metrics.astype(np.int32), pa.array(self.metric_types))
+        columns["Reporting_Period_Total"] = self.totals[metrics, rows]
+        return self._arrow_table(columns, self.usage[metrics, rows])
+
+    # Title, Reporting_Period_Total and monthly usage of the selected metric type, built from the arrays
+    @property
+    def metric_dataframe(self) -> pd.DataFrame:
+        return self.get_metric_dataframe(self.get_rows())
+
+    # Returns metric_dataframe for only the given rows, without the monthly usage if include_months is False
+    def get_metric_dataframe(self, rows: np.ndarray, include_months: bool = True) -> pd.DataFrame:
+        metric = self._metric_index()
+        if include_months:
+            df = pd.DataFrame(self.usage[metric, rows], index=rows, columns=self._month_columns())
+        else:
+            df = pd.DataFrame(index=rows)
+        df.insert(0, "Reporting_Period_Total", self.totals[metric, rows])
+        df.insert(0, "Title", self.title_names.take(self.title_ids[rows]))
+        return df.rename_axis("Row Index")
+
+    # Returns get_metric_dataframe(rows) as an Arrow table, like get_arrow_table()
+    def get_metric_arrow_table(self, rows: np.ndarray) -> pa.Table:
+        metric = self._metric_index()
+        columns = {"Row Index": rows, "Title": self._arrow_titles(rows),
+                   "Reporting_Period_Total": self.totals[metric, rows]}
+        return self._arrow_table(columns, self.usage[metric, rows])
+
+    # Title of each of rows as a dictionary array over title_names, which is converted to Arrow once per report
+    def _arrow_titles(self, rows: np.ndarray) -> pa.DictionaryArray:
+        if "arrow_titles" not in self.derived:
+            self.derived["arrow_titles"] = pa.array(self.title_names.to_numpy(dtype=object), type=pa.string())
+        return pa.DictionaryArray.from_arrays(self.title_ids[rows], self.derived["arrow_titles"])
+
+    # Builds an Arrow table from columns followed by one column per month of usage, named like the report's
+    # headers (Jul-2019). Each month is a contiguous column of the Fortran-ordered usage, so none is copied again.
+    def _arrow_table(self, columns: dict, usage: np.ndarray) -> pa.Table:
+        usage = np.asfortranarray(usage)
+        month_names = pd.DatetimeIndex(self.months).strftime("%b-%Y")
+        columns.update((name, usage[:, j]) for j, name in enumerate(month_names))
+        return pa.table(columns)
+
+    # Returns the column headers of the report, only the months are kept once usage is built
+    def _headers(self) -> np.ndarray:
+        if self._raw_dataframe is not None:
+            return self._raw_dataframe.columns.values
+        return self.months.astype("datetime64[us]").astype(object)
+
+    # Month headers as datetimes, kept as an object index so pandas doesn't convert them to Timestamps
+    def _month_columns(self) -> pd.Index:
+        return pd.Index(self._headers(), dtype=object)
+
+    # Position of the selected metric type in metric_types
+    def _metric_index(self) -> int:
+        return self.metric_types.index(self.metric_type)
     
-    # Sets start date by iterating through headers and finding first datetime value
+    # Sets start date to the first month with usage, which build_usage() has already found
     def set_start_date(self) -> None:
-        for header in self.dataframe.columns.values:
-            if type(header) == datetime:
-                self.start_date = header
-                break
+        if len(self.months):
+            self.start_date = month_from_ordinal(int(self.get_month_ordinals()[0]))
 
-    # Sets end date by finding the last datetime header
+    # Sets end date to the last month with usage
     def set_end_date(self) -> None:
-        for header in self.dataframe.columns.values:
-            if type(header) == datetime:
-                self.end_date = header
+        if len(self.months):
+            self.end_date = month_from_ordinal(int(self.get_month_ordinals()[-1]))
 
-    # Sets rpt by summing the 'Reporting Period Total' column
+    # Sets rpt to the 'Reporting Period Total' sum of the selected metric, which is summed once in build_usage()
     def set_reporting_period_total(self) -> None:
-        self.rpt = self.dataframe['Reporting_Period_Total'].sum()
+        self.rpt = self.period_totals[self._metric_index()]
+
+    # Returns the name of the package the report belongs to, its platform or publisher as chosen by by
+    # ("Platform" or "Publisher"), falling back on the other one when the report doesn't give it. A report whose
+    # titles have several values is not assigned to any of them and is a package of its own, named after the file.
+    def get_package(self, by: str = "Platform") -> str:
+        if self.has_mixed_package(by):
+            return f"{self.name} (several {by.lower()}s)"
+        values = (self.platforms, self.publishers) if by == "Platform" else (self.publishers, self.platforms)
+        return next((names[0] for names in values if len(names) == 1), "Unknown")
+
+    # Returns whether the report's titles have more than one Platform or Publisher, as chosen by by
+    def has_mixed_package(self, by: str = "Platform") -> bool:
+        return len(self.platforms if by == "Platform" else self.publishers) > 1
+
+    # Returns the number of titles that have a row for metric_type
+    def get_title_count(self, metric_type: str) -> int:
+        return int(self.present[self.metric_types.index(metric_type)].sum())
+
+    # Returns the rows that have the selected metric type
+    def get_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.present[self._metric_index()])
+
+    # Returns the titles that have the selected metric type
+    def get_titles(self) -> pd.Index:
+        return self.title_names.take(np.unique(self.title_ids[self.get_rows()]))
+
+    # Returns the usage of all titles in each month for the selected metric
+    def get_monthly_totals(self) -> np.ndarray:
+        return self.monthly_totals[self._metric_index()]
+
+    # Returns the Reporting_Period_Total of each title for the selected metric
+    def get_reporting_period_totals(self) -> np.ndarray:
+        metric = self._metric_index()
+        return self.totals[metric, self.present[metric]]
+
+    # Selects the metric type used for metric_dataframe and rpt, which only changes an index into the arrays
+    def select_metric(self, metric_type: str) -> None:
+        self.metric_type = metric_type
+        self.set_reporting_period_total()
     
     # Sets cost per use given cost as a parameter
     def set_cost_per_use(self, cost) -> None:
@@ -89,32 +335,167 @@ class TRJ1:
     def set_projected_cost_per_use(self, cost) -> None:
         self.projected_cpu = float(cost / self.projected_usage)
 
+    # Returns a copy whose costs and selected metric can be changed without modifying this TRJ1.
+    # The arrays are read-only after build_usage(), so they are shared rather than copied.
+    def copy(self) -> "TRJ1":
+        trj1_copy = TRJ1.__new__(TRJ1)
+        for slot in TRJ1.__slots__:
+            setattr(trj1_copy, slot, getattr(self, slot))
+        return trj1_copy
+
     # Determines whether file is a full Fiscal Year by subtracting start and end date
     def is_Full_FY(self) -> bool:
         diff = self.end_date - self.start_date # -> timedelta type
         return diff.days >= 335
     
-    # Removes columns that will not be used 
+    # Removes columns that will not be used and builds the usage arrays
     def clean_dataframe(self) -> None:
+        df = self._raw_dataframe
+        # errors="ignore" since chunked csv/tsv reading already leaves these columns out
+        df.drop(columns=UNUSED_COLUMNS, inplace=True, errors="ignore")
+        # missing identifiers stay missing, only the usage columns have blanks counted as 1. Columns without
+        # blanks are skipped, which leaves the categorical Metric_Type of chunked csv/tsv reading as it is.
+        usage_columns = [column for column in df.columns.difference([*DETAIL_COLUMNS, *PACKAGE_COLUMNS], sort=False)
+                         if df[column].hasnans]
+        df[usage_columns] = df[usage_columns].fillna(1)
+        self.build_usage()
+
+    # Builds the usage arrays from the cleaned dataframe, which is then released
+    def build_usage(self) -> None:
+        df = self._raw_dataframe
+        months = [column for column in df.columns if isinstance(column, datetime)]
+        metric_codes, metric_types = pd.factorize(np.asarray(df["Metric_Type"], dtype=object), sort=True)
+        title_codes, title_names = pd.factorize(df["Title"])
+        # a title can be listed more than once, so rows are matched on the title and its occurrence
+        occurrence = df.groupby([title_codes, metric_codes]).cumcount().to_numpy()
+        row_ids, row_keys = pd.factorize(occurrence * max(len(title_names), 1) + title_codes)
+
+        shape = (len(metric_types), len(row_keys))
+        self.usage = np.zeros(shape + (len(months),), dtype=np.int32)
+        self.usage[metric_codes, row_ids] = to_usage_counts(df[months].to_numpy(), "month")
+        self.totals = np.zeros(shape, dtype=np.int32)
+        self.totals[metric_codes, row_ids] = to_usage_counts(df["Reporting_Period_Total"].to_numpy(),
+                                                             "Reporting_Period_Total")
+        self.present = np.zeros(shape, dtype=bool)
+        self.present[metric_codes, row_ids] = True
+
+        self.title_ids = np.empty(len(row_keys), dtype=np.int32)
+        self.title_ids[row_ids] = title_codes
+        detail_columns = [column for column in DETAIL_COLUMNS if column in df.columns]
+        self.title_details = (df[detail_columns].astype(object).groupby(row_ids).first()
+                              .reset_index(drop=True))
+        self.title_names = title_names
+        self.metric_types = tuple(metric_types)
+        # files are grouped into packages whole, so only the distinct values are kept
+        if "Platform" in df.columns:
+            self.platforms = _distinct_values(df["Platform"])
+        if "Publisher" in df.columns:
+            self.publishers = _distinct_values(df["Publisher"])
+        self.months = pd.DatetimeIndex(months).to_numpy().astype("datetime64[M]")
+        self._raw_dataframe = None
+        self._finish_usage()
+
+    # Sums the usage arrays and sets the fields read from them, once they are built or loaded from the disk cache
+    def _finish_usage(self) -> None:
+        self.period_totals = self.totals.sum(axis=1, dtype=np.int64)
+        self.monthly_totals = self.usage.sum(axis=1, dtype=np.int64)
         self.set_start_date()
         self.set_end_date()
-        self.dataframe.drop(columns=["Publisher", "Publisher_ID", "Platform",
-             "DOI", "Proprietary_ID", "Print_ISSN", "Online_ISSN", "URI"], inplace=True)
-        self.dataframe.replace(np.nan, 1, regex=True, inplace=True)
-        self.dataframe = self.dataframe.rename_axis("Row Index")
+        self.read_report_header()
+        self.freeze()
+
+    # Returns the usage arrays as an Arrow table for the on-disk cache, with one row per metric type and row of
+    # usage, along with the fields needed to rebuild the TRJ1 from it. Usage is a fixed size list column whose
+    # values are the usage array itself, and titles are dictionary encoded against title_names. The per-row
+    # columns of the first metric type hold title_details, the later ones are null.
+    def get_cache_table(self) -> Tuple[pa.Table, dict]:
+        metric_count, row_count, month_count = self.usage.shape
+        size = metric_count * row_count
+        columns = {"Title": pa.DictionaryArray.from_arrays(np.tile(self.title_ids, metric_count),
+                                                           pa.array(self.title_names.to_numpy(dtype=object)))}
+        for column in self.title_details.columns:
+            values = np.full(size, None, dtype=object)
+            values[:row_count] = self.title_details[column].to_numpy()
+            columns[column] = pa.array(values, from_pandas=True)
+        columns["Reporting_Period_Total"] = self.totals.reshape(-1)
+        columns["present"] = self.present.reshape(-1).view(np.uint8)
+        columns["usage"] = pa.FixedSizeListArray.from_arrays(pa.array(self.usage.reshape(-1)), month_count)
+        fields = {"rows": row_count, "metric_types": list(self.metric_types),
+                  "months": self.get_month_ordinals().tolist(), "detail_columns": list(self.title_details.columns),
+                  "report_header": self.report_header, "platforms": list(self.platforms),
+                  "publishers": list(self.publishers)}
+        return (pa.table(columns), fields)
+
+    # Rebuilds a TRJ1 from a table and fields returned by get_cache_table(). The numeric arrays are views of the
+    # table's buffers, so a memory-mapped table is not copied, and no dataframe is built.
+    @classmethod
+    def from_cache_table(cls, name: str, table: pa.Table, fields: dict, source_hash: str = None) -> "TRJ1":
+        row_count = fields["rows"]
+        trj1_file = cls(name, None, source_hash=source_hash, report_header=fields["report_header"],
+                        platforms=fields["platforms"], publishers=fields["publishers"])
+        trj1_file.metric_types = tuple(fields["metric_types"])
+        trj1_file.months = np.array(fields["months"], dtype=np.int64).astype("datetime64[M]")
+        shape = (len(trj1_file.metric_types), row_count)
+
+        usage = _single_chunk(table.column("usage")).flatten()
+        trj1_file.usage = usage.to_numpy().reshape(shape + (len(trj1_file.months),))
+        trj1_file.totals = _single_chunk(table.column("Reporting_Period_Total")).to_numpy().reshape(shape)
+        trj1_file.present = _single_chunk(table.column("present")).to_numpy().view(bool).reshape(shape)
+        titles = _single_chunk(table.column("Title"))
+        trj1_file.title_ids = titles.indices.to_numpy()[:row_count]
+        trj1_file.title_names = pd.Index(titles.dictionary.to_numpy(zero_copy_only=False), dtype=object)
+        trj1_file.title_details = pd.DataFrame(
+            {column: table.column(column).slice(0, row_count).to_numpy() for column in fields["detail_columns"]},
+            index=pd.RangeIndex(row_count), dtype=object)
+        trj1_file._raw_dataframe = None
+        trj1_file._finish_usage()
+        return trj1_file
+
+    # Reads the Reporting_Period and Institution_ID of the report header and checks the header against the usage
+    # columns, once usage is built. Dates still come from the usage columns, since those are what usage and
+    # projections are computed from, and every disagreement is listed in header_issues.
+    def read_report_header(self) -> None:
+        header = self.report_header
+        self.institution_id = header.get("Institution_ID", "")
+        self.reporting_period = parse_reporting_period(header.get("Reporting_Period", ""))
+        self.header_issues = []
+        if not header:
+            return
+
+        ordinals = self.get_month_ordinals()
+        if self.reporting_period is None:
+            self.header_issues.append("the header has no valid Reporting_Period")
+        elif len(ordinals) and (month_ordinal(self.reporting_period[0]), month_ordinal(self.reporting_period[1])) \
+                != (ordinals[0], ordinals[-1]):
+            self.header_issues.append(
+                f"the header's Reporting_Period is {self.reporting_period[0].strftime('%m/%Y')} - "
+                f"{self.reporting_period[1].strftime('%m/%Y')}, but the file has usage for "
+                f"{self.start_date.strftime('%m/%Y')} - {self.end_date.strftime('%m/%Y')}")
+        if np.any(np.diff(ordinals) != 1):
+            self.header_issues.append("the usage columns are not consecutive months")
+
+        listed = {metric.strip() for metric in re.split(r"[;|]", header.get("Metric_Types", ""))}
+        missing = [metric for metric in METRIC_TYPES if metric in listed and metric not in self.metric_types]
+        if missing:
+            self.header_issues.append(f"the header lists {', '.join(missing)} but the file has no rows for it")
+
+    # Makes the arrays read-only. Copies share them, and a TRJ1 can be shared by every session of the app,
+    # so writing to them would change the data of other sessions. Arrays unpickled from a worker process
+    # are writeable again, which is why this is also called when a TRJ1 is cached.
+    def freeze(self) -> None:
+        for array in (self.title_ids, self.months, self.usage, self.totals, self.present,
+                      self.period_totals, self.monthly_totals):
+            array.flags.writeable = False
     
+    # Returns the month_ordinal of every month with usage data, in report order
+    def get_month_ordinals(self) -> np.ndarray:
+        return self.months.astype(np.int64)
+
     # Returns all dates as a list of datetime values
     def get_header_dates(self) -> List[datetime]:
-        date_range = []
-        for header in self.dataframe.columns.values:
-            if type(header) == datetime:
-                date_range.append(header)
-            else:
-                try:
-                    timestamp_type = pd.to_datetime(header)
-                    date_type = timestamp_type.date()
-                    curr_datetime = datetime(date_type.year, date_type.month, date_type.day)
-                    date_range.append(curr_datetime)
-                except ValueError:
-                    continue
-        return date_range
+        if self._raw_dataframe is None:
+            # once usage is built every header is a month, so none has to be parsed
+            return self.months.astype("datetime64[us]").tolist()
+        # the readers convert month headers to datetimes, so the other columns are simply skipped
+        return [header for header in self._headers() if isinstance(header, datetime)]
+
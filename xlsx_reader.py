@@ -0,0 +1,219 @@
+# This file contains the xlsx reader for TR_J1 reports. It streams the worksheet XML instead of building
+# openpyxl's workbook model, reads the COUNTER header block above the table into metadata and returns
+# the table with its usage counts already typed.
+
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from trj1 import METRIC_TYPES, UNUSED_COLUMNS, to_usage_counts
+
+# Key of DataFrame.attrs holding the COUNTER header block of a report, such as Report_Name and Reporting_Period
+HEADER_ATTR = "counter_header"
+
+# Day zero of the dates stored as numbers in xlsx files
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+
+class UnstreamableWorkbook(Exception):
+    """
+    Raised when a workbook isn't laid out the way the streaming reader expects, such as a missing worksheet
+    or table header, so that read_trj1_xlsx reads it with pd.read_excel instead. Errors in the data itself,
+    such as counts that don't fit in an int32, are not wrapped and reach the caller.
+    """
+
+
+# Reads the TR_J1 report in source, a path or binary buffer, whose column headers are on row skiprows + 1.
+# Takes the same arguments as pd.read_excel in parse_trj1 and, like read_csv_chunked, leaves out unused
+# columns and rows of other metric types, counts blank usage as 1 and stores the counts as int32.
+# Workbooks that can't be streamed, for example ones without their parts in the expected place,
+# are read with pd.read_excel instead.
+def read_trj1_xlsx(source, skiprows: int = 13, index_col=False, metric_types=METRIC_TYPES) -> pd.DataFrame:
+    try:
+        with zipfile.ZipFile(source) as workbook:
+            header, df = _read_sheet(workbook, skiprows, metric_types)
+    except (UnstreamableWorkbook, zipfile.BadZipFile):
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return pd.read_excel(source, skiprows=skiprows, index_col=index_col)
+    df.attrs[HEADER_ATTR] = header
+    return df
+
+
+def _read_sheet(workbook: zipfile.ZipFile, skiprows: int,
+                metric_types) -> Tuple[Dict[str, str], pd.DataFrame]:
+    strings = _read_shared_strings(workbook)
+    rows = _iter_rows(workbook, _first_sheet_path(workbook), strings)
+
+    # the COUNTER header block is a column of names with their values next to them
+    header = {}
+    names = None
+    for row_number, cells in rows:
+        if row_number <= skiprows:
+            if cells.get(0) is not None:
+                header[str(cells[0]).strip()] = "" if cells.get(1) is None else str(cells[1]).strip()
+            continue
+        names = [cells.get(j) for j in range(max(cells) + 1)] if cells else []
+        break
+    if not names or "Reporting_Period_Total" not in names:
+        raise UnstreamableWorkbook("the column headers of the TR_J1 table were not found")
+
+    # COUNTER reports list the months after the Reporting_Period_Total column
+    first_count = names.index("Reporting_Period_Total")
+    names[first_count + 1:] = [_to_month(name) for name in names[first_count + 1:]]
+    kept = [j for j, name in enumerate(names) if name is not None and name not in UNUSED_COLUMNS]
+    counts = [j for j in kept if j >= first_count]
+    labels = [j for j in kept if j < first_count]
+
+    values = {j: [] for j in labels}
+    usage = {j: [] for j in counts}
+    for _, cells in rows:
+        for j in labels:
+            values[j].append(cells.get(j))
+        for j in counts:
+            usage[j].append(_to_count(cells.get(j)))
+
+    columns = {names[j]: pd.Series(values[j], dtype=object) for j in labels}
+    columns.update((names[j], to_usage_counts(usage[j], str(names[j]))) for j in counts)
+    df = pd.DataFrame(columns)
+    if "Metric_Type" in df.columns:
+        df = df[df["Metric_Type"].isin(metric_types)].reset_index(drop=True)
+        df["Metric_Type"] = df["Metric_Type"].astype("category")
+    return (header, df)
+
+
+# Returns the path in the archive of the workbook's first worksheet
+def _first_sheet_path(workbook: zipfile.ZipFile) -> str:
+    sheets = ET.fromstring(_read_part(workbook, "xl/workbook.xml"))
+    sheet = next((element for element in sheets.iter() if _local_name(element.tag) == "sheet"), None)
+    relationships = ET.fromstring(_read_part(workbook, "xl/_rels/workbook.xml.rels"))
+    target = next((element.get("Target") for element in relationships
+                   if sheet is not None and element.get("Id") == sheet.get(_REL_NS)), None)
+    if not target:
+        path = "xl/worksheets/sheet1.xml"
+    else:
+        path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+    if path not in workbook.namelist():
+        raise UnstreamableWorkbook(f"the worksheet {path} is missing")
+    return path
+
+
+# Returns the bytes of the part name of the workbook, which must be there for it to be streamed
+def _read_part(workbook: zipfile.ZipFile, name: str) -> bytes:
+    try:
+        return workbook.read(name)
+    except KeyError:
+        raise UnstreamableWorkbook(f"the part {name} is missing") from None
+
+
+# Returns the workbook's shared strings, which string cells refer to by position
+def _read_shared_strings(workbook: zipfile.ZipFile) -> List[str]:
+    if "xl/sharedStrings.xml" not in workbook.namelist():
+        return []
+    strings = []
+    with workbook.open("xl/sharedStrings.xml") as f:
+        for _, element in ET.iterparse(f):
+            if _local_name(element.tag) == "si":
+                strings.append(_string_text(element))
+                element.clear()
+    return strings
+
+
+# Text of a shared string <si>: its own <t>, or the <t> of each run of rich text. Phonetic guides (<rPh>) have
+# <t> too, which are left out as openpyxl does.
+def _string_text(element: ET.Element) -> str:
+    texts = []
+    for child in element:
+        name = _local_name(child.tag)
+        if name == "t":
+            texts.append(child.text or "")
+        elif name == "r":
+            texts.extend(text.text or "" for text in child if _local_name(text.tag) == "t")
+    return "".join(texts)
+
+
+# Yields the row number and the values of the non-empty cells, keyed by column position, of every row of
+# the sheet. Each row is released once it has been read, so the whole sheet is never held in memory.
+def _iter_rows(workbook: zipfile.ZipFile, path: str, strings: List[str]) -> Iterator[Tuple[int, Dict[int, object]]]:
+    positions = {}
+    with workbook.open(path) as f:
+        row_number = 0
+        namespace = None
+        for _, element in ET.iterparse(f):
+            if namespace is None:
+                # every element of the sheet is in the namespace of the first one closed
+                namespace = element.tag[:element.tag.find("}") + 1]
+                row_tag, value_tag, text_tag = (namespace + "row", namespace + "v", namespace + "t")
+            if element.tag != row_tag:
+                continue
+            row_number = int(element.get("r", row_number + 1))
+            cells = {}
+            position = -1
+            for cell in element:
+                reference = cell.get("r")
+                if reference:
+                    letters = reference.rstrip("0123456789")
+                    position = positions.get(letters)
+                    if position is None:
+                        position = positions[letters] = _column_position(letters)
+                else:
+                    position += 1
+                value = _cell_value(cell, strings, value_tag, text_tag)
+                if value is not None:
+                    cells[position] = value
+            element.clear()
+            yield (row_number, cells)
+
+
+# Value of a <c> element: a string, a bool, an int or float, or None when the cell is empty or an error
+def _cell_value(cell: ET.Element, strings: List[str], value_tag: str, text_tag: str):
+    cell_type = cell.get("t")
+    if cell_type == "inlineStr":
+        return "".join(text.text or "" for text in cell.iter(text_tag))
+    value = cell.findtext(value_tag)
+    if value is None or cell_type == "e":
+        return None
+    if cell_type == "s":
+        return strings[int(value)]
+    if cell_type == "str":
+        return value
+    if cell_type == "b":
+        return value == "1"
+    # like openpyxl, whole numbers are returned as ints
+    return float(value) if "." in value or "E" in value or "e" in value else int(value)
+
+
+# Position of the column with letters such as "AB", counting from 0
+def _column_position(letters: str) -> int:
+    position = 0
+    for character in letters.upper():
+        position = position * 26 + ord(character) - ord("A") + 1
+    return position - 1
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+# Converts a month header, stored as a date number or as text such as "Jul-2019", to a datetime
+def _to_month(header) -> Optional[object]:
+    if isinstance(header, (int, float)) and not isinstance(header, bool):
+        return _EXCEL_EPOCH + timedelta(days=header)
+    try:
+        return pd.to_datetime(header).to_pydatetime()
+    except (ValueError, TypeError):
+        return header
+
+
+def _to_count(value) -> float:
+    if value is None or isinstance(value, bool):
+        return np.nan
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan